@@ -1,15 +1,15 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import os
 import sys
 from datetime import datetime
 
 from src.exception import CustomeException
-from src.pipelines.predict_pipeline import CustomData, PredictPipeline
-from sklearn.preprocessing import StandardScaler
+from src.pipelines.predict_pipeline import CustomData
+from src.pipelines.prediction_cache import PredictionCache
 from src.components.data_ingestion import DataIngestion
-from src.pipelines.train_pipeline import run_training_pipeline
+from src.pipelines.training_jobs import training_jobs
+from src.components.model_registry import ModelRegistry
 
 
 st.set_page_config(page_title="Student Marks Predictor", page_icon=":pencil:", layout="wide")
@@ -106,19 +106,48 @@ def show_home():
     Enjoy exploring the model and experimenting with it!
     """)
 
-    btn = st.button('Load and Train with new data')
-    last_training_datetime = f'Last trained at {datetime.now().strftime("%Y-%m-%d %H:%M")}'
+    # training runs as a background job, the page only submits it and polls its status
+    job = training_jobs.status()
+    running = job is not None and job['status'] in ('queued', 'running')
+
+    btn = st.button('Load and Train with new data', disabled=running)
     if btn:
-        with st.spinner('Training Model with latest data...'):
-            result = run_training_pipeline()
+        # successive halving keeps the retrain short, see ModelTrainer.search_summary for the gap to the full grid
+        training_jobs.submit(search_strategy='halving')
+        job = training_jobs.status()
+        running = True
+
+    if running:
+        st.progress(job['progress'], text=f"Training model with latest data... ({job['stage'] or 'starting'})")
+        col1, col2 = st.columns(2)
+        col1.button('Refresh status')
+        if col2.button('Cancel training'):
+            training_jobs.cancel()
+    elif job is not None and job['status'] == 'succeeded':
         st.success("Training Completed!")
         st.write('Make predictions based on new data now')
-        last_training_datetime = f'Last trained at {datetime.now().strftime("%Y-%m-%d %H:%M")}'
+    elif job is not None and job['status'] == 'failed':
+        st.error(f"Training failed: {job['error']}")
+    elif job is not None and job['status'] == 'cancelled':
+        st.warning('Training was cancelled, the previous model is still in use')
+
+    model_path = os.path.join('artifact', 'model.pkl')
+    last_training_datetime = 'Not trained yet'
+    registry = ModelRegistry()
+    active_version = registry.active_version()
+    if active_version is not None:
+        last_training_datetime = f'Last trained at {datetime.fromtimestamp(registry.metadata(active_version)["registered_at"]).strftime("%Y-%m-%d %H:%M")}'
+    elif os.path.exists(model_path):
+        last_training_datetime = f'Last trained at {datetime.fromtimestamp(os.path.getmtime(model_path)).strftime("%Y-%m-%d %H:%M")}'
     st.caption(last_training_datetime)
     st.caption("[LinkedIn](https://www.linkedin.com/in/akshaypratap08/)", text_alignment='right')
     st.caption("[Github](https://github.com/akshaypratap008)", text_alignment='right')
     st.caption("Created by Akshay :)", text_alignment='right')
 
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(max_size=10_000, ttl=3600)
+
 def show_predict():
     st.sidebar.header("Select Features")
     st.sidebar.write('Choose value')
@@ -151,13 +180,11 @@ def show_predict():
         'writing_score': 'Writing Score'
     }))
 
-    predict_pipeline = PredictPipeline()
-    result = predict_pipeline.predict(input_df)
-
-
     col1, col2, col3= st.columns(3)
     btn = col2.button("Predict Math's Score", use_container_width=True)
     if btn:
+        # only score when asked; repeated inputs are served from the cache until a new model is trained
+        result = get_prediction_cache().predict(input_data)
         if int(result) >= 50:
             st.balloons()
         st.markdown(f"<h2 style='text-align:center; color:white;'>The Student's Predicted Math Score", unsafe_allow_html=True, text_alignment='justify')
@@ -185,15 +212,61 @@ def show_predict():
 
         
 
-def show_full_data():
-    obj = DataIngestion(
+DATA_PAGE_SIZES = [25, 50, 100, 250]
+DATA_CACHE_TTL = 300        # seconds a fetched page stays cached
+
+def get_data_ingestion():
+    return DataIngestion(
         host = '127.0.0.1',
         user = 'root',
         password = '',
         database= 'mlproject1'
     )
-    query = 'SELECT * FROM stud'
-    st.table(obj.load_data(query=query))
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def fetch_data_page(page_number, page_size, filters, sort_by, descending):
+    # filters comes in as a tuple of items so that it can be hashed by the cache
+    return get_data_ingestion().load_page(page_number, page_size, dict(filters), sort_by, descending)
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def fetch_row_count(filters):
+    return get_data_ingestion().count_rows(dict(filters))
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def fetch_distinct(column):
+    return get_data_ingestion().load_distinct(column)
+
+def show_full_data():
+    st.sidebar.header("Filter data")
+    filters = {}
+    for column, label in [
+        ('gender', 'Gender'),
+        ('race_ethnicity', 'Race / Ethnicity'),
+        ('parental_level_of_education', 'Parental Level of Education'),
+        ('lunch', 'Lunch'),
+        ('test_preparation_course', 'Test Preparation Course'),
+    ]:
+        value = st.sidebar.selectbox(label, ['All'] + fetch_distinct(column))
+        if value != 'All':
+            filters[column] = value
+
+    math_range = st.sidebar.slider("Math score", 0, 100, (0, 100))
+    if math_range != (0, 100):
+        filters['math_score'] = math_range
+
+    sort_by = st.sidebar.selectbox("Sort by", ['None', 'math_score', 'reading_score', 'writing_score'])
+    descending = st.sidebar.checkbox("Descending")
+    page_size = st.sidebar.selectbox("Rows per page", DATA_PAGE_SIZES, index=1)
+
+    # only a count and the current page are queried, both cached for DATA_CACHE_TTL
+    filter_key = tuple(sorted(filters.items()))
+    total = fetch_row_count(filter_key)
+    n_pages = max(1, -(-total // page_size))
+    page_number = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1) - 1
+
+    df = fetch_data_page(int(page_number), page_size, filter_key, None if sort_by == 'None' else sort_by, descending)
+    st.caption(f"{total} matching rows")
+    st.dataframe(df, use_container_width=True, hide_index=True)
         
 if page == 'Home':
     show_home()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_data import build_sqlite_stud, make_stud_frame  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SUITES = ('ingestion', 'transformation', 'search', 'inference')
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_ingestion(n_rows, work_dir):
+    from src.components.data_ingestion import DataIngestion
+
+    url = build_sqlite_stud(os.path.join(work_dir, f'stud_{n_rows}.db'), n_rows)
+    ingestion = DataIngestion(conn_url=url)
+    ingestion.ingestion_config.artifact_dir = os.path.join(work_dir, f'artifact_{n_rows}')
+
+    _, full_s = timed(ingestion.initiate_data_ingestion)
+
+    def stream():
+        return sum(len(chunk) for chunk in ingestion.load_data_chunks('SELECT * FROM stud', chunksize=50_000))
+    streamed, stream_s = timed(stream)
+
+    return {
+        'full_ingestion_s': full_s,
+        'full_ingestion_rows_per_s': n_rows / full_s,
+        'streamed_read_s': stream_s,
+        'streamed_read_rows_per_s': streamed / stream_s,
+        'connections': ingestion.connection_stats()
+    }
+
+
+def bench_transformation(n_rows, work_dir):
+    from src.components.data_transformation import DataTransformation
+
+    df = make_stud_frame(n_rows)
+    X = df.drop(columns=['math_score'])
+    preprocessor = DataTransformation().get_data_transformer_object()
+
+    _, fit_s = timed(preprocessor.fit_transform, X)
+    _, transform_s = timed(preprocessor.transform, X)
+
+    return {
+        'fit_transform_s': fit_s,
+        'transform_s': transform_s,
+        'transform_rows_per_s': n_rows / transform_s
+    }
+
+
+def bench_search(n_rows, work_dir, strategy, n_jobs):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.tree import DecisionTreeRegressor
+    from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+
+    from src.components.data_transformation import DataTransformation
+    from src.execution_budget import ExecutionBudget
+    from src.utils import evaluate_model
+
+    df = make_stud_frame(n_rows)
+    X = DataTransformation().get_data_transformer_object().fit_transform(df.drop(columns=['math_score']))
+    y = df['math_score'].to_numpy(dtype=float)
+    split = int(n_rows * 0.8)
+
+    models = {
+        'Linear Regression': LinearRegression(),
+        'Decision Tree': DecisionTreeRegressor(),
+        'Random Forrest': RandomForestRegressor(),
+        'Gradient Boost': GradientBoostingRegressor()
+    }
+    params = {
+        'Linear Regression': {},
+        'Decision Tree': {'criterion': ['squared_error', 'friedman_mse']},
+        'Random Forrest': {'n_estimators': [8, 16, 32, 64]},
+        'Gradient Boost': {'learning_rate': [.1, .05], 'subsample': [0.7, 0.9], 'n_estimators': [16, 32, 64]}
+    }
+
+    details = {}
+    budget = ExecutionBudget(n_jobs)
+    with budget.measure():
+        _, total_s = timed(evaluate_model, X[:split], y[:split], X[split:], y[split:], models, params,
+                           n_jobs=n_jobs, search_strategy=strategy, details=details, budget=budget)
+
+    return {
+        'strategy': strategy,
+        'total_search_s': total_s,
+        'execution': budget.plan,
+        'per_model': {name: {'search_s': d['search_seconds'], 'n_fits': d['n_fits'], 'test_r2': d['test_score']}
+                      for name, d in details.items()}
+    }
+
+
+def bench_inference(n_rows, work_dir, single_row_calls=2000):
+    from sklearn.linear_model import LinearRegression
+
+    from src.components.data_transformation import DataTransformation
+    from src.pipelines.predict_pipeline import FEATURE_COLUMNS, PredictPipeline
+    from src.utils import save_object
+
+    train = make_stud_frame(5000, seed=1)
+    preprocessor = DataTransformation().get_data_transformer_object()
+    model = LinearRegression().fit(preprocessor.fit_transform(train.drop(columns=['math_score'])), train['math_score'])
+
+    model_path = os.path.join(work_dir, 'bench_model.pkl')
+    preprocessor_path = os.path.join(work_dir, 'bench_preprocessor.pkl')
+    save_object(model_path, model)
+    save_object(preprocessor_path, preprocessor)
+
+    results = {}
+    data = make_stud_frame(n_rows, seed=2)[FEATURE_COLUMNS]
+    rows = data.head(single_row_calls).to_dict('records')
+
+    for use_compiled in (False, True):
+        pipeline = PredictPipeline()
+        config = pipeline.predict_pipeline_config
+        config.use_registry, config.use_compiled = False, use_compiled
+        config.model_path, config.preprocessor_path = model_path, preprocessor_path
+        pipeline.predict_row(rows[0])       # warm the artifact cache
+
+        latencies = []
+        for row in rows:
+            start = time.perf_counter()
+            pipeline.predict_row(row)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1e6
+
+        _, batch_s = timed(pipeline.predict_batch, data)
+
+        results['compiled' if use_compiled else 'sklearn'] = {
+            'single_row_p50_us': float(np.percentile(latencies, 50)),
+            'single_row_p99_us': float(np.percentile(latencies, 99)),
+            'batch_s': batch_s,
+            'batch_rows_per_s': n_rows / batch_s
+        }
+
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    import pandas
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+        'git_commit': commit
+    }
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    '''
+    prints every numeric metric present in both runs with its relative change
+    '''
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    print(f"{'metric':<70}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name in sorted(set(old) & set(new)):
+        change = f'{(new[name] - old[name]) / old[name]:+.1%}' if old[name] else ''
+        print(f'{name:<70}{old[name]:>14.4g}{new[name]:>14.4g}{change:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ingestion, transformation, model search and inference')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated row counts, eg. 1000,...,10000000')
+    parser.add_argument('--suites', default=','.join(SUITES), help=f'comma separated subset of {SUITES}')
+    parser.add_argument('--search-max-rows', type=int, default=20_000, help='model search only runs on sizes up to this')
+    parser.add_argument('--search-strategy', default='grid')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--output', default=None, help='result json path (default benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='earlier result json to compare against')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    suites = args.suites.split(',')
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in sizes:
+            size_results = results.setdefault(str(n_rows), {})
+            for suite in suites:
+                print(f'{suite} @ {n_rows} rows', flush=True)
+                if suite == 'ingestion':
+                    size_results[suite] = bench_ingestion(n_rows, work_dir)
+                elif suite == 'transformation':
+                    size_results[suite] = bench_transformation(n_rows, work_dir)
+                elif suite == 'search' and n_rows <= args.search_max_rows:
+                    size_results[suite] = bench_search(n_rows, work_dir, args.search_strategy, args.n_jobs)
+                elif suite == 'inference':
+                    size_results[suite] = bench_inference(n_rows, work_dir)
+
+    run = {'created_at': datetime.now().isoformat(), 'environment': environment(), 'results': results}
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file_obj:
+        json.dump(run, file_obj, indent=2)
+    print(f'Results written to {output}')
+
+    if args.baseline:
+        with open(args.baseline) as file_obj:
+            compare(json.load(file_obj), run)
+
+
+if __name__ == "__main__":
+    main()
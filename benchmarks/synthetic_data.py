@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+# category frequencies roughly follow notebooks/data/stud.csv
+CATEGORIES = {
+    'gender': (['female', 'male'], [0.52, 0.48]),
+    'race_ethnicity': (['group A', 'group B', 'group C', 'group D', 'group E'], [0.09, 0.19, 0.32, 0.26, 0.14]),
+    'parental_level_of_education': (
+        ["some college", "associate's degree", 'high school', 'some high school', "bachelor's degree", "master's degree"],
+        [0.23, 0.22, 0.19, 0.18, 0.12, 0.06]
+    ),
+    'lunch': (['standard', 'free/reduced'], [0.65, 0.35]),
+    'test_preparation_course': (['none', 'completed'], [0.64, 0.36])
+}
+
+
+def make_stud_frame(n_rows, seed=0, start_id=1):
+    '''
+    stud shaped DataFrame: the five categorical features, integer scores in 0..100 and an id column
+    '''
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'id': np.arange(start_id, start_id + n_rows)})
+    for column, (values, weights) in CATEGORIES.items():
+        df[column] = rng.choice(values, size=n_rows, p=weights)
+
+    ability = rng.normal(66, 14, n_rows)
+    prep_bonus = np.where(df['test_preparation_course'] == 'completed', 5, 0)
+    lunch_bonus = np.where(df['lunch'] == 'standard', 6, 0)
+
+    df['reading_score'] = np.clip(np.rint(ability + rng.normal(2, 5, n_rows) + prep_bonus), 0, 100).astype(int)
+    df['writing_score'] = np.clip(np.rint(ability + rng.normal(1, 5, n_rows) + prep_bonus), 0, 100).astype(int)
+    df['math_score'] = np.clip(np.rint(ability + rng.normal(0, 6, n_rows) + lunch_bonus - 3), 0, 100).astype(int)
+
+    return df[['id', 'gender', 'race_ethnicity', 'parental_level_of_education', 'lunch',
+               'test_preparation_course', 'math_score', 'reading_score', 'writing_score']]
+
+
+def build_sqlite_stud(path, n_rows, seed=0, chunk_size=500_000):
+    '''
+    writes an n_rows stud table to a sqlite file (generated chunk by chunk) and returns its url
+    '''
+    if os.path.exists(path):
+        os.remove(path)
+
+    url = f'sqlite:///{path}'
+    engine = create_engine(url)
+    for i, start in enumerate(range(0, n_rows, chunk_size)):
+        chunk = make_stud_frame(min(chunk_size, n_rows - start), seed=seed + i, start_id=start + 1)
+        chunk.to_sql('stud', engine, if_exists='replace' if i == 0 else 'append', index=False)
+    engine.dispose()
+
+    return url
@@ -0,0 +1,140 @@
+import os
+import sys
+import hashlib
+import pickle
+import threading
+
+from src.exception import CustomeException
+
+# kept free of pandas/sklearn/dill imports: this is all a prediction worker needs to load artifacts
+
+
+def load_object(file_path):
+    try:
+        with open(file_path, "rb") as file_obj:
+            return pickle.load(file_obj)
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+
+class ArtifactCache:
+    '''
+    Process wide cache of unpickled artifacts (model, preprocessor).
+    An entry is keyed on the absolute path and is revalidated against the file's
+    mtime/size on every lookup; when those change the content hash decides whether
+    the file really changed and needs to be unpickled again.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}      # abs path -> {'signature', 'digest', 'obj'}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _signature(file_path):
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, file_path):
+        return self.get_with_digest(file_path)[0]
+
+    def get_with_digest(self, file_path):
+        '''
+        (object, sha256 of the bytes it was unpickled from); reading the two separately could
+        pair an object with the hash of a file replaced in between
+        '''
+        try:
+            key = os.path.abspath(file_path)
+            signature = self._signature(key)
+
+            entry = self._entries.get(key)
+            if entry is not None and entry['signature'] == signature:
+                with self._lock:
+                    self.hits += 1
+                return entry['obj'], entry['digest']
+
+            with open(key, 'rb') as file_obj:
+                payload = file_obj.read()
+            digest = hashlib.sha256(payload).hexdigest()
+
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry['digest'] == digest:
+                    # file was touched or rewritten with identical content
+                    entry['signature'] = signature
+                    self.hits += 1
+                    return entry['obj'], entry['digest']
+
+            # unpickle outside the lock, then swap the entry in one assignment so
+            # concurrent readers keep using the old object until the new one is ready
+            obj = pickle.loads(payload)
+
+            with self._lock:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.reloads += 1
+                self._entries[key] = {'signature': signature, 'digest': digest, 'obj': obj}
+
+            return obj, digest
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def version(self, file_path):
+        '''
+        returns the content hash of the cached artifact, loading it if needed
+        '''
+        return self.get_with_digest(file_path)[1]
+
+    def invalidate(self, file_path=None):
+        # the entry is kept so that the next load is counted as a reload; clearing the
+        # signature forces the content hash check on the next lookup
+        with self._lock:
+            if file_path is None:
+                for entry in self._entries.values():
+                    entry['signature'] = None
+            elif os.path.abspath(file_path) in self._entries:
+                self._entries[os.path.abspath(file_path)]['signature'] = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'entries': len(self._entries)
+            }
+
+
+artifact_cache = ArtifactCache()
+
+
+def load_cached_object(file_path):
+    return artifact_cache.get(file_path)
+
+
+_digests = {}       # abs path -> (mtime/size signature, sha256)
+
+def file_digest(file_path):
+    '''
+    sha256 of a file without unpickling it, recomputed only when its mtime/size change
+    '''
+    key = os.path.abspath(file_path)
+    signature = ArtifactCache._signature(key)
+    cached = _digests.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(key, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b''):
+            digest.update(block)
+    _digests[key] = (signature, digest.hexdigest())
+    return _digests[key][1]
@@ -1,67 +1,263 @@
 import os
 import sys
+import json
+import threading
 from src.exception import CustomeException
 from src.logger import logging
+from src.storage import artifact_file, write_frame
+from src.profiler import profile_stage
 
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
 from dataclasses import dataclass
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 
-from src.components.data_transformation import DataTransformation, DataTransformationConfig
-from src.components.model_trainer import ModelTrainingConfig, ModelTrainer
+# columns of the stud table that can be filtered and sorted on; anything else is rejected
+# so user input never ends up in the sql text
+STUD_COLUMNS = [
+    'gender',
+    'race_ethnicity',
+    'parental_level_of_education',
+    'lunch',
+    'test_preparation_course',
+    'math_score',
+    'reading_score',
+    'writing_score'
+]
 
 @dataclass
 class DataIngestionConfig:
-    train_data_path:str = os.path.join('artifact', 'train.csv')
-    test_data_path:str = os.path.join('artifact', 'test.csv')
-    raw_data_path:str = os.path.join('artifact', 'data.csv')
+    artifact_dir:str = 'artifact'
+    artifact_format:str = 'parquet'     # 'parquet', 'arrow' or 'csv'
+    export_csv:bool = False             # also write csv copies of data/train/test next to the binary files
+    # unique key of stud (eg. an AUTO_INCREMENT id) that breaks ties between pages; stud has none,
+    # so by default pages are ordered by every column, which is a total order up to identical rows
+    page_key_column:str = None
+
+    # incremental mode: only rows past the watermark are pulled and appended to a parquet store
+    incremental:bool = False
+    # a column that only grows as rows are inserted (auto increment id, insert timestamp). the stud
+    # table has none, so it must be added to the table and named here before incremental runs
+    watermark_column:str = None
+    state_file_path:str = os.path.join('artifact', 'ingestion_state.json')
+    store_train_dir:str = os.path.join('artifact', 'store', 'train')
+    store_test_dir:str = os.path.join('artifact', 'store', 'test')
+    test_percent:int = 20
+
+    @property
+    def train_data_path(self):
+        return artifact_file(self.artifact_dir, 'train', self.artifact_format)
+
+    @property
+    def test_data_path(self):
+        return artifact_file(self.artifact_dir, 'test', self.artifact_format)
+
+    @property
+    def raw_data_path(self):
+        return artifact_file(self.artifact_dir, 'data', self.artifact_format)
+
+# one pooled engine per connection url, shared by every DataIngestion in the process
+_engines = {}
+_engine_stats = {}
+_engine_lock = threading.Lock()
+
+def get_engine(conn_url):
+    '''
+    returns the shared pooled engine for conn_url, creating it on first use
+    '''
+    with _engine_lock:
+        engine = _engines.get(conn_url)
+        if engine is None:
+            if conn_url.startswith('sqlite'):
+                # sqlite picks its own pool class and rejects the sizing arguments
+                engine = create_engine(conn_url)
+            else:
+                engine = create_engine(conn_url, pool_size=5, max_overflow=5, pool_pre_ping=True, pool_recycle=3600)
+
+            stats = {'connections_opened': 0, 'checkouts': 0}
+
+            def on_connect(dbapi_connection, connection_record):
+                stats['connections_opened'] += 1
+
+            def on_checkout(dbapi_connection, connection_record, connection_proxy):
+                stats['checkouts'] += 1
+
+            event.listen(engine, 'connect', on_connect)
+            event.listen(engine, 'checkout', on_checkout)
+
+            _engines[conn_url] = engine
+            _engine_stats[conn_url] = stats
+            logging.info('Sql server connection pool created')
+
+        return engine
+
+def connection_stats(conn_url=None):
+    '''
+    physical connections opened and pool checkouts, per url or for a single url
+    '''
+    with _engine_lock:
+        if conn_url is not None:
+            return dict(_engine_stats.get(conn_url, {'connections_opened': 0, 'checkouts': 0}))
+        return {url: dict(stats) for url, stats in _engine_stats.items()}
 
 class DataIngestion:
-    def __init__(self, host, user, password, database):
+    def __init__(self, host=None, user=None, password=None, database=None, conn_url=None):
         self.ingestion_config = DataIngestionConfig()
         self.host = host
         self.user = user
         self.password = password
         self.database = database
 
-        #create sql server connection url
-        self.conn_url = f'mysql+pymysql://{user}:{password}@{host}/{database}'
+        #create sql server connection url, an explicit url (eg. sqlite) takes precedence
+        self.conn_url = conn_url or f'mysql+pymysql://{user}:{password}@{host}/{database}'
+        self._checked_key_columns = set()
     
-    def load_data(self, query):
-        # create MySQL connection
+    def load_data(self, query, params=None):
         try:
-            engine = create_engine(self.conn_url)
-            logging.info('Sql server connection created ')
+            engine = get_engine(self.conn_url)
 
-            df = pd.read_sql(query, engine)
+            with engine.connect() as conn:
+                df = pd.read_sql(text(query), conn, params=params)
             logging.info('Data loaded succesfully from mysql')
 
             return df
         except Exception as e:
             raise CustomeException(e, sys)
 
+    def load_data_chunks(self, query, params=None, chunksize=50_000):
+        '''
+        generator yielding DataFrame chunks of the query result. the rows are streamed with a
+        server side cursor, so memory stays bounded by chunksize whatever the table size
+        '''
+        try:
+            engine = get_engine(self.conn_url)
+
+            with engine.connect().execution_options(stream_results=True) as conn:
+                for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunksize):
+                    yield chunk
+            logging.info('Data streamed succesfully from mysql')
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def connection_stats(self):
+        return connection_stats(self.conn_url)
+
+    def load_page(self, page=0, page_size=50, filters=None, sort_by=None, descending=False):
+        '''
+        returns one page of the stud table with filtering, sorting and LIMIT/OFFSET
+        done by the database. filters maps a column to a value (equality) or a (low, high) tuple (range).
+        the order always ends with a tie-breaker, so rows with equal sort values neither repeat
+        nor go missing across pages
+        '''
+        try:
+            where, params = self._build_where(filters)
+
+            order = []
+            if sort_by is not None:
+                self._check_column(sort_by)
+                order.append(f"{sort_by} {'DESC' if descending else 'ASC'}")
+            order.extend(self._tie_breaker())
+
+            params.update({'limit': int(page_size), 'offset': int(page) * int(page_size)})
+            return self.load_data(f"SELECT * FROM stud{where} ORDER BY {', '.join(order)} LIMIT :limit OFFSET :offset", params=params)
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def count_rows(self, filters=None):
+        try:
+            where, params = self._build_where(filters)
+            return int(self.load_data(f'SELECT COUNT(*) AS n FROM stud{where}', params=params)['n'].iloc[0])
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def load_distinct(self, column):
+        self._check_column(column)
+        df = self.load_data(f'SELECT DISTINCT {column} FROM stud ORDER BY {column}')
+        return df[column].tolist()
+
+    def load_value_counts(self, column, filters=None, holdout=None):
+        '''
+        ({value: count}, null count) of a column, aggregated by the database with GROUP BY;
+        for the stud columns this is at most ~100 rows whatever the table size.
+        holdout=(key column, test percent) leaves out the rows with key % 100 < test percent,
+        the holdout of StreamingTrainer
+        '''
+        try:
+            self._check_column(column)
+            where, params = self._build_where(filters)
+            if holdout is not None:
+                key_column, test_percent = holdout
+                self._check_table_column(key_column)
+                where += f"{' AND' if where else ' WHERE'} MOD({key_column}, 100) >= :test_percent"
+                params['test_percent'] = int(test_percent)
+            df = self.load_data(f'SELECT {column} AS value, COUNT(*) AS n FROM stud{where} GROUP BY {column}', params=params)
+
+            is_null = df['value'].isna()
+            counts = df[~is_null]
+            return dict(zip(counts['value'].tolist(), counts['n'].astype(int).tolist())), int(df.loc[is_null, 'n'].sum())
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def _tie_breaker(self):
+        key_column = self.ingestion_config.page_key_column
+        if key_column is None:
+            return list(STUD_COLUMNS)
+        if key_column not in self._checked_key_columns:
+            self._check_table_column(key_column)
+            self._checked_key_columns.add(key_column)
+        return [key_column]
+
+    @staticmethod
+    def _check_column(column):
+        if column not in STUD_COLUMNS:
+            raise ValueError(f'Unknown column {column!r}')
+
+    def _build_where(self, filters):
+        clauses, params = [], {}
+        for i, (column, value) in enumerate((filters or {}).items()):
+            self._check_column(column)
+            if isinstance(value, (tuple, list)):
+                clauses.append(f'{column} BETWEEN :lo{i} AND :hi{i}')
+                params[f'lo{i}'], params[f'hi{i}'] = value
+            else:
+                clauses.append(f'{column} = :v{i}')
+                params[f'v{i}'] = value
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+
     def initiate_data_ingestion(self):
         logging.info("Entered the data ingestion method or component")
+
+        if self.ingestion_config.incremental:
+            return self.initiate_incremental_ingestion()
         
         try:
             query = 'SELECT * FROM stud'
-            df = self.load_data(query)
+            with profile_stage('sql_fetch') as stage:
+                df = self.load_data(query)
+                stage['rows'] = len(df)
             logging.info('Data succesfully read from server and stored as dataframe')
 
-            # save raw data            
-            os.makedirs(os.path.dirname(self.ingestion_config.raw_data_path), exist_ok=True)
-            df.to_csv(self.ingestion_config.raw_data_path, index = False, header = True)
+            with profile_stage('write_artifacts', rows=len(df)):
+                # save raw data            
+                write_frame(df, self.ingestion_config.raw_data_path)
+
+                #train test split
+                logging.info('Train test split initiated')
+                from sklearn.model_selection import train_test_split
+                train_set, test_set = train_test_split(df, test_size=0.2, random_state=42)
 
-            #train test split
-            logging.info('Train test split initiated')
-            train_set, test_set = train_test_split(df, test_size=0.2, random_state=42)
+                # save train and test data
+                write_frame(train_set, self.ingestion_config.train_data_path)
+                write_frame(test_set, self.ingestion_config.test_data_path)
 
-            # save train and test data
-            train_set.to_csv(self.ingestion_config.train_data_path, index = False, header=True)
-            test_set.to_csv(self.ingestion_config.test_data_path, index = False, header=True)
+                if self.ingestion_config.export_csv:
+                    for name, frame in (('data', df), ('train', train_set), ('test', test_set)):
+                        write_frame(frame, artifact_file(self.ingestion_config.artifact_dir, name, 'csv'))
 
             logging.info('Data Ingestion completed')
 
@@ -72,6 +268,101 @@ class DataIngestion:
             )
         except Exception as e:
             raise CustomeException(e, sys)
+
+    def initiate_incremental_ingestion(self):
+        '''
+        pulls only the rows whose watermark column is past the stored high-water mark,
+        appends them as new parquet parts to the train/test stores and advances the mark.
+        rows are assigned to train or test by a hash of their watermark value, so a row
+        always lands in the same split no matter when it was ingested
+        '''
+        try:
+            config = self.ingestion_config
+            column = config.watermark_column
+            self._check_watermark_column(column)
+            watermark = self.read_watermark()
+
+            if watermark is None:
+                query, params = f'SELECT * FROM stud ORDER BY {column}', None
+            else:
+                query, params = f'SELECT * FROM stud WHERE {column} > :watermark ORDER BY {column}', {'watermark': watermark}
+
+            with profile_stage('sql_fetch') as stage:
+                df = self.load_data(query, params=params)
+                stage['rows'] = len(df)
+            logging.info(f'Incremental ingestion pulled {len(df)} new rows past watermark {watermark}')
+
+            if len(df) > 0:
+                is_test = self.hash_split(df[column], config.test_percent)
+                # named by the mark the pull started from: a run that crashes before the mark moves
+                # pulls again from the same mark (the same rows plus any newer ones) and overwrites
+                # these parts instead of adding a second copy of the rows under another name
+                start = 'start' if watermark is None else self._watermark_token(watermark)
+                part_name = f'part-after-{start}.parquet'
+
+                for store_dir, part in ((config.store_train_dir, df[~is_test]), (config.store_test_dir, df[is_test])):
+                    os.makedirs(store_dir, exist_ok=True)
+                    part_path = os.path.join(store_dir, part_name)
+                    if len(part) > 0:
+                        write_frame(part, part_path)
+                    elif os.path.exists(part_path):
+                        os.remove(part_path)
+
+                self.write_watermark(df[column].max())
+
+            logging.info('Incremental data ingestion completed')
+
+            return (
+                config.store_train_dir,
+                config.store_test_dir
+            )
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    @staticmethod
+    def hash_split(keys, test_percent):
+        '''
+        deterministic test assignment: True for rows whose key hashes into the test bucket
+        '''
+        hashes = pd.util.hash_pandas_object(keys.astype(str), index=False).to_numpy()
+        return pd.Series(hashes % 100 < test_percent, index=keys.index)
+
+    def _check_watermark_column(self, column):
+        if column is None:
+            raise ValueError('Incremental ingestion needs DataIngestionConfig.watermark_column: a column of stud '
+                             'that grows with every insert, eg. an AUTO_INCREMENT id or an insert timestamp')
+        self._check_table_column(column)
+
+    def _check_table_column(self, column):
+        # for key columns, which are not in STUD_COLUMNS: the name goes into the sql text,
+        # so it must be a real column of the table
+        columns = self.load_data('SELECT * FROM stud LIMIT 0').columns
+        if column not in columns:
+            raise ValueError(f'{column!r} is not a column of stud ({list(columns)})')
+
+    def read_watermark(self):
+        if not os.path.exists(self.ingestion_config.state_file_path):
+            return None
+        with open(self.ingestion_config.state_file_path) as file_obj:
+            return json.load(file_obj).get('watermark')
+
+    def write_watermark(self, watermark):
+        # numpy ints and timestamps are stored in a json friendly form
+        if hasattr(watermark, 'isoformat'):
+            watermark = watermark.isoformat()
+        elif hasattr(watermark, 'item'):
+            watermark = watermark.item()
+
+        state_path = self.ingestion_config.state_file_path
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump({'watermark_column': self.ingestion_config.watermark_column, 'watermark': watermark}, file_obj)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _watermark_token(value):
+        return ''.join(c if c.isalnum() else '_' for c in str(value))
         
 if __name__ == "__main__":
     obj = DataIngestion(
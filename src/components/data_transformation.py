@@ -3,7 +3,6 @@ import os
 from dataclasses import dataclass
 
 import numpy as np
-import pandas as pd
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
@@ -13,11 +12,19 @@ from src.exception import CustomeException
 from src.logger import logging
 
 from src.utils import save_object
+from src.storage import read_frame
+from src.profiler import profile_stage
 
 @dataclass
 class DataTransformationConfig:
     preprocessor_ob_file_path = os.path.join('artifact', 'preprocessor.pkl')
 
+    # persist X/y as separate .npy files and hand memory mapped views to the trainer
+    # instead of building train_arr/test_arr copies with np.c_
+    persist_arrays:bool = False
+    arrays_dir:str = os.path.join('artifact', 'features')
+    array_dtype:str = 'float32'
+
 class DataTransformation:
     def __init__(self):
         self.data_transformation_config = DataTransformationConfig()
@@ -58,10 +65,41 @@ class DataTransformation:
         except Exception as e:
             raise CustomeException(e, sys)
     
+    def get_data_transformer_object_from_sql(self, data_ingestion, filters=None, holdout=None):
+        '''
+        the preprocessor fitted on the stud table without reading it: medians, most frequent values,
+        category sets and scaler moments all follow from per column GROUP BY counts run by the database.
+        holdout=(key column, test percent) fits it on the train rows of StreamingTrainer's split only
+        '''
+        try:
+            # imported here, streaming_trainer itself builds on this module
+            from src.components.streaming_trainer import PreprocessorStats, build_fitted_preprocessor
+
+            preprocessor = self.get_data_transformer_object()
+            feature_columns = {name: columns for name, _, columns in preprocessor.transformers}
+            stats = PreprocessorStats(feature_columns['num_pipeline'], feature_columns['cat_pipeline'])
+
+            with profile_stage('sql_stats') as stage:
+                for column in stats.value_counts:
+                    counts, nulls = data_ingestion.load_value_counts(column, filters, holdout)
+                    stats.add_counts(column, counts, nulls)
+                # every column's counts add up to the table's row count
+                stats.n_rows = sum(counts.values()) + nulls
+                stage['rows'] = stats.n_rows
+            logging.info(f'Preprocessor statistics aggregated in the database over {stats.n_rows} rows')
+
+            return build_fitted_preprocessor(stats, preprocessor)
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
     def initiate_data_transformation(self, train_path, test_path):
         try:
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            # parquet/arrow/csv files or directories of incremental parts
+            with profile_stage('read_artifacts') as stage:
+                train_df = read_frame(train_path)
+                test_df = read_frame(test_path)
+                stage['rows'] = len(train_df) + len(test_df)
 
             logging.info('Read train and test data')
             logging.info('Obtaining preprocessing object')
@@ -82,8 +120,27 @@ class DataTransformation:
             logging.info('Applying preprocessing object on training dataframe and testing dataframe')
 
             #apply transformation on input features on train and test df
-            input_feature_train_arr = preprocessor_obj.fit_transform(input_feature_train_df)
-            input_feature_test_arr = preprocessor_obj.transform(input_feature_test_df)
+            with profile_stage('transform_fit', rows=len(input_feature_train_df)):
+                input_feature_train_arr = preprocessor_obj.fit_transform(input_feature_train_df)
+            with profile_stage('transform_apply', rows=len(input_feature_test_df)):
+                input_feature_test_arr = preprocessor_obj.transform(input_feature_test_df)
+
+            # save preprocessing object as pickle 
+            logging.info('Saved preprocessing object')
+
+            with profile_stage('save_preprocessor'):
+                save_object(
+                    file_path = self.data_transformation_config.preprocessor_ob_file_path,
+                    obj = preprocessor_obj
+                )
+
+            if self.data_transformation_config.persist_arrays:
+                # (X, y) tuples of read only memory maps, shared by every training process
+                return (
+                    (self.save_array('X_train', input_feature_train_arr), self.save_array('y_train', target_feature_train_df)),
+                    (self.save_array('X_test', input_feature_test_arr), self.save_array('y_test', target_feature_test_df)),
+                    self.data_transformation_config.preprocessor_ob_file_path
+                )
 
             #create test_arr and train_arr by concatinating input features and target features
             train_arr = np.c_[
@@ -93,14 +150,6 @@ class DataTransformation:
                 input_feature_test_arr, np.array(target_feature_test_df)
             ]
 
-            # save preprocessing object as pickle 
-            logging.info('Saved preprocessing object')
-
-            save_object(
-                file_path = self.data_transformation_config.preprocessor_ob_file_path,
-                obj = preprocessor_obj
-            )
-
             return (
                 train_arr,
                 test_arr, 
@@ -109,4 +158,21 @@ class DataTransformation:
 
         except Exception as e:
             raise CustomeException(e, sys)
-            
\ No newline at end of file
+
+    def save_array(self, name, arr):
+        '''
+        writes arr as <arrays_dir>/<name>.npy (atomically) and returns a read only memory map of it
+        '''
+        config = self.data_transformation_config
+        os.makedirs(config.arrays_dir, exist_ok=True)
+
+        arr = np.asarray(arr)
+        if np.issubdtype(arr.dtype, np.number):
+            arr = arr.astype(config.array_dtype, copy=False)
+
+        path = os.path.join(config.arrays_dir, f'{name}.npy')
+        tmp_path = os.path.join(config.arrays_dir, f'.{name}.tmp.npy')
+        np.save(tmp_path, np.ascontiguousarray(arr))
+        os.replace(tmp_path, path)
+
+        return np.load(path, mmap_mode='r')
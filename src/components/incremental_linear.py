@@ -0,0 +1,232 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.utils import save_object, load_object
+from src.artifact_cache import file_digest
+from src.storage import read_frame
+from src.components.data_transformation import DataTransformation
+from src.components.streaming_trainer import PreprocessorStats, TARGET_COLUMN, build_fitted_preprocessor
+
+@dataclass
+class IncrementalLinearConfig:
+    state_file_path:str = os.path.join('artifact', 'linear_state.pkl')
+    trained_model_file_path:str = os.path.join('artifact', 'model.pkl')
+    preprocessor_ob_file_path:str = os.path.join('artifact', 'preprocessor.pkl')
+    rcond:float = 1e-10     # relative cutoff of the pseudo inverse; the one hot blocks make the design rank deficient
+
+class LinearState:
+    '''
+    Sufficient statistics of preprocessor + LinearRegression over every row folded in so far.
+    Rows are kept as a raw design z = [1, numeric values (nulls as 0), numeric null flags,
+    category indicators, category null flags]. Whatever medians, modes and scaler moments
+    the full data ends up with, the preprocessor output is a linear map of z, so z'z, z'y and
+    the column histograms are enough to rebuild exactly what a full refit would produce.
+    '''
+    def __init__(self, num_columns, cat_columns):
+        self.stats = PreprocessorStats(num_columns, cat_columns)
+        self.categories = {column: [] for column in cat_columns}    # in order of first appearance
+        self.gram = np.zeros((1, 1))
+        self.zy = np.zeros(1)
+        self.yy = 0.0
+        self.parts = {}         # name -> content digest of the incremental store parts already folded in
+
+    def layout(self):
+        '''
+        column index of every raw design entry, by ('const',), ('num', column), ('num_null', column),
+        ('cat', column, value) and ('cat_null', column)
+        '''
+        index = {('const',): 0}
+        for column in self.stats.num_columns:
+            index[('num', column)] = len(index)
+            index[('num_null', column)] = len(index)
+        for column in self.stats.cat_columns:
+            for value in self.categories[column]:
+                index[('cat', column, value)] = len(index)
+            index[('cat_null', column)] = len(index)
+        return index
+
+    def update(self, df):
+        '''
+        folds in new rows, O(len(df)) whatever has been folded in before
+        '''
+        # new categories get zero rows/columns: every earlier row had a 0 indicator for them
+        old_layout = self.layout()
+        for column in self.stats.cat_columns:
+            seen = set(self.categories[column])
+            for value in df[column].dropna().unique():
+                if value not in seen:
+                    self.categories[column].append(value)
+                    seen.add(value)
+
+        layout = self.layout()
+        if len(layout) != len(old_layout):
+            positions = [layout[key] for key in old_layout]
+            gram, zy = np.zeros((len(layout), len(layout))), np.zeros(len(layout))
+            gram[np.ix_(positions, positions)] = self.gram
+            zy[positions] = self.zy
+            self.gram, self.zy = gram, zy
+
+        Z = np.zeros((len(df), len(layout)))
+        Z[:, 0] = 1.0
+        for column in self.stats.num_columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            missing = np.isnan(values)
+            Z[:, layout[('num', column)]] = np.where(missing, 0.0, values)
+            Z[:, layout[('num_null', column)]] = missing
+        for column in self.stats.cat_columns:
+            values = df[column]
+            Z[:, layout[('cat_null', column)]] = values.isna().to_numpy()
+            for value in self.categories[column]:
+                Z[:, layout[('cat', column, value)]] = (values == value).to_numpy()
+
+        y = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+        self.gram += Z.T @ Z
+        self.zy += Z.T @ y
+        self.yy += float(y @ y)
+        self.stats.update(df)
+
+    def design_map(self, preprocessor):
+        '''
+        M with preprocessor.transform(rows) == z(rows) @ M for the fitted preprocessor
+        '''
+        layout = self.layout()
+        transformers = {name: (pipeline, columns) for name, pipeline, columns in preprocessor.transformers_}
+        num_pipeline, num_columns = transformers['num_pipeline']
+        cat_pipeline, cat_columns = transformers['cat_pipeline']
+
+        num_fill = num_pipeline.named_steps['imputer'].statistics_
+        num_scaler = num_pipeline.named_steps['scaler']
+        cat_fill = cat_pipeline.named_steps['imputer'].statistics_
+        encoder = cat_pipeline.named_steps['one_hot_encoder']
+        cat_scale = cat_pipeline.named_steps['scaler'].scale_
+
+        n_features = len(num_columns) + sum(len(categories) for categories in encoder.categories_)
+        M = np.zeros((len(layout), n_features))
+
+        for k, column in enumerate(num_columns):
+            # (value + fill * null - mean) / scale
+            scale = num_scaler.scale_[k]
+            M[layout[('num', column)], k] = 1 / scale
+            M[layout[('num_null', column)], k] = num_fill[k] / scale
+            M[0, k] = -num_scaler.mean_[k] / scale
+
+        k = len(num_columns)
+        for column, fill, categories in zip(cat_columns, cat_fill, encoder.categories_):
+            for value in categories:
+                # (indicator + null if value is the fill) / scale
+                M[layout[('cat', column, value)], k] = 1 / cat_scale[k - len(num_columns)]
+                if value == fill:
+                    M[layout[('cat_null', column)], k] = 1 / cat_scale[k - len(num_columns)]
+                k += 1
+
+        return M
+
+
+class IncrementalLinearTrainer:
+    '''
+    Keeps a LinearState in a small state file and refits preprocessor + LinearRegression
+    from it in closed form. Folding in new rows costs O(new rows); the fit itself only
+    touches matrices of the design width (~20 x 20), never the data.
+    '''
+    def __init__(self):
+        self.incremental_linear_config = IncrementalLinearConfig()
+        self.state = None
+
+    def load_state(self):
+        path = self.incremental_linear_config.state_file_path
+        if os.path.exists(path):
+            self.state = load_object(path)
+        else:
+            columns = {name: columns for name, _, columns in DataTransformation().get_data_transformer_object().transformers}
+            self.state = LinearState(columns['num_pipeline'], columns['cat_pipeline'])
+        return self.state
+
+    def fold_parts(self, store_dir):
+        '''
+        folds every parquet part of an incremental store that is not in the state yet, returns the row count added
+        '''
+        try:
+            state = self.state or self.load_state()
+            new_rows = 0
+            if os.path.isdir(store_dir):
+                for file_name in sorted(os.listdir(store_dir)):
+                    if not file_name.endswith('.parquet'):
+                        continue
+                    part_path = os.path.join(store_dir, file_name)
+                    digest = file_digest(part_path)
+                    if file_name in state.parts:
+                        # ingestion rewrites a part only when a run crashed before its mark moved;
+                        # rows folded from the old content cannot be taken out again
+                        if state.parts[file_name] != digest:
+                            raise ValueError(f'Store part {file_name} changed after it was folded in, '
+                                             f'delete {self.incremental_linear_config.state_file_path} to rebuild the state')
+                        continue
+                    df = read_frame(part_path)
+                    state.update(df)
+                    state.parts[file_name] = digest
+                    new_rows += len(df)
+
+            logging.info(f'Folded {new_rows} new rows into the linear state ({state.stats.n_rows} rows in total)')
+            return new_rows
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def fit(self):
+        '''
+        (preprocessor, LinearRegression) equal to fitting both on every row folded in so far
+        '''
+        try:
+            from sklearn.linear_model import LinearRegression
+
+            state = self.state or self.load_state()
+            preprocessor = build_fitted_preprocessor(state.stats)
+            M = state.design_map(preprocessor)
+
+            # LinearRegression centers X and y and takes the minimum norm least squares solution;
+            # the same solution from the centered normal equations
+            n = state.gram[0, 0]
+            XtX = M.T @ state.gram @ M
+            Xty = M.T @ state.zy
+            x_mean = M.T @ state.gram[:, 0] / n
+            y_mean = state.zy[0] / n
+
+            Sxx = XtX - n * np.outer(x_mean, x_mean)
+            Sxy = Xty - n * x_mean * y_mean
+            coef = np.linalg.pinv(Sxx, rcond=self.incremental_linear_config.rcond, hermitian=True) @ Sxy
+
+            model = LinearRegression()
+            model.coef_ = coef
+            model.intercept_ = float(y_mean - x_mean @ coef)
+            model.n_features_in_ = len(coef)
+            model.rank_ = int(np.linalg.matrix_rank(Sxx))
+            model.singular_ = np.sqrt(np.clip(np.linalg.eigvalsh(Sxx)[::-1], 0, None))
+
+            return preprocessor, model
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def refresh(self, store_dir):
+        '''
+        folds the new parts of store_dir, refits and saves preprocessor, model and state
+        '''
+        try:
+            config = self.incremental_linear_config
+            new_rows = self.fold_parts(store_dir)
+            preprocessor, model = self.fit()
+
+            save_object(config.preprocessor_ob_file_path, preprocessor)
+            save_object(config.trained_model_file_path, model)
+            # the state is saved last: if anything above fails the parts are folded again next time
+            save_object(config.state_file_path, self.state)
+
+            return new_rows
+
+        except Exception as e:
+            raise CustomeException(e, sys)
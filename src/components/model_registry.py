@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.pipelines.tree_predictor import TREE_EXPORT_DIR
+
+ARTIFACT_FILES = ('model.pkl', 'preprocessor.pkl')
+
+@dataclass
+class ModelRegistryConfig:
+    registry_dir:str = os.path.join('artifact', 'registry')
+
+    @property
+    def versions_dir(self):
+        return os.path.join(self.registry_dir, 'versions')
+
+    @property
+    def active_pointer_path(self):
+        return os.path.join(self.registry_dir, 'ACTIVE.json')
+
+class ModelRegistry:
+    '''
+    Local registry of trained model/preprocessor pairs.
+    Each pair is stored under versions/<content hash>/ together with a metadata.json
+    (data watermark, chosen model, best params, r2, train time, artifact size).
+    ACTIVE.json points at the version that serving uses; switching it is a single atomic
+    rename, so rollbacks and A/B switches never retrain or copy artifacts.
+    '''
+    def __init__(self, registry_dir=None):
+        self.registry_config = ModelRegistryConfig()
+        if registry_dir is not None:
+            self.registry_config.registry_dir = registry_dir
+        self._pointer_cache = (None, None)      # (pointer inode/mtime/size, pointer contents)
+
+    def register(self, model_path, preprocessor_path, metadata=None, activate=True):
+        '''
+        stores the pair under its content hash (a no-op if it is already registered) and returns the version
+        '''
+        try:
+            digest = hashlib.sha256()
+            for path in (model_path, preprocessor_path):
+                with open(path, 'rb') as file_obj:
+                    for block in iter(lambda: file_obj.read(1 << 20), b''):
+                        digest.update(block)
+            version = digest.hexdigest()[:16]
+
+            version_dir = self.version_dir(version)
+            if not os.path.isdir(version_dir):
+                os.makedirs(self.registry_config.versions_dir, exist_ok=True)
+                tmp_dir = os.path.join(self.registry_config.versions_dir, f'.tmp_{version}_{os.getpid()}')
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                os.makedirs(tmp_dir)
+
+                for path, file_name in zip((model_path, preprocessor_path), ARTIFACT_FILES):
+                    shutil.copy2(path, os.path.join(tmp_dir, file_name))
+                # the array export of a tree model, if training wrote one next to model.pkl
+                trees_dir = os.path.join(os.path.dirname(model_path), TREE_EXPORT_DIR)
+                if os.path.isdir(trees_dir):
+                    shutil.copytree(trees_dir, os.path.join(tmp_dir, TREE_EXPORT_DIR))
+
+                entry = dict(metadata or {})
+                entry.update({
+                    'version': version,
+                    'registered_at': time.time(),
+                    'artifact_size': sum(os.path.getsize(os.path.join(tmp_dir, f)) for f in ARTIFACT_FILES)
+                })
+                with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as file_obj:
+                    json.dump(entry, file_obj, indent=2, default=str)
+
+                try:
+                    # a directory rename fails if the target exists and is non empty: whoever renames
+                    # first allocates the version, and a concurrent registration of the same content loses
+                    os.rename(tmp_dir, version_dir)
+                    logging.info(f'Registered model version {version}')
+                except OSError:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    if not os.path.isdir(version_dir):
+                        raise
+
+            if activate:
+                self.activate(version)
+
+            return version
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def activate(self, version):
+        try:
+            if not os.path.isdir(self.version_dir(version)):
+                raise ValueError(f'Unknown model version {version!r}')
+
+            pointer = self._read_pointer()
+            history = [v for v in pointer.get('history', []) if v != version]
+            if pointer.get('active') is not None and pointer['active'] != version:
+                history.append(pointer['active'])
+
+            self._write_pointer({'active': version, 'history': history[-20:], 'activated_at': time.time()})
+            logging.info(f'Activated model version {version}')
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def rollback(self):
+        '''
+        re-activates the previously active version and returns it
+        '''
+        try:
+            pointer = self._read_pointer()
+            history = pointer.get('history', [])
+            if not history:
+                raise ValueError('No earlier model version to roll back to')
+
+            previous = history[-1]
+            self._write_pointer({'active': previous, 'history': history[:-1], 'activated_at': time.time()})
+            logging.info(f'Rolled back to model version {previous}')
+            return previous
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def active_version(self):
+        return self._read_pointer().get('active')
+
+    def version_dir(self, version):
+        return os.path.join(self.registry_config.versions_dir, version)
+
+    def artifact_paths(self, version=None):
+        '''
+        (model path, preprocessor path) of version, or of the active version; None when nothing is active
+        '''
+        version = version or self.active_version()
+        if version is None:
+            return None
+        version_dir = self.version_dir(version)
+        return tuple(os.path.join(version_dir, file_name) for file_name in ARTIFACT_FILES)
+
+    def metadata(self, version):
+        with open(os.path.join(self.version_dir(version), 'metadata.json')) as file_obj:
+            return json.load(file_obj)
+
+    def list_versions(self):
+        versions_dir = self.registry_config.versions_dir
+        if not os.path.isdir(versions_dir):
+            return []
+        entries = [self.metadata(v) for v in os.listdir(versions_dir) if not v.startswith('.')]
+        return sorted(entries, key=lambda entry: entry['registered_at'])
+
+    def _read_pointer(self):
+        # the pointer is re-read only when the file changed, serving checks it on every prediction
+        path = self.registry_config.active_pointer_path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {}
+
+        # every write replaces the file, so the inode changes even within one mtime tick
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._pointer_cache[0] != signature:
+            with open(path) as file_obj:
+                self._pointer_cache = (signature, json.load(file_obj))
+        return self._pointer_cache[1]
+
+    def _write_pointer(self, pointer):
+        path = self.registry_config.active_pointer_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp_{os.getpid()}'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(pointer, file_obj)
+        os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect and switch registered model versions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='list registered versions')
+    activate_parser = subparsers.add_parser('activate', help='serve a registered version')
+    activate_parser.add_argument('version')
+    subparsers.add_parser('rollback', help='serve the previously active version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    if args.command == 'list':
+        active = registry.active_version()
+        for entry in registry.list_versions():
+            marker = '*' if entry['version'] == active else ' '
+            print(f"{marker} {entry['version']}  {entry.get('model_name')}  r2={entry.get('r2')}  size={entry['artifact_size']}")
+    elif args.command == 'activate':
+        registry.activate(args.version)
+    else:
+        print(registry.rollback())
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 from dataclasses import dataclass
 
 from sklearn.linear_model import LinearRegression
@@ -14,23 +15,42 @@ from sklearn.metrics import r2_score
 from src.exception import CustomeException
 from src.logger import logging
 from src.utils import save_object
-from src.utils import evaluate_model
+from src.utils import evaluate_model, clear_checkpoints, data_fingerprint
 from src.components.data_transformation import DataTransformationConfig
+from src.profiler import profile_stage
+from src.execution_budget import ExecutionBudget
+from src.pipelines.tree_predictor import export_trees
 
 import pickle
 
 @dataclass
 class ModelTrainingConfig:
     trained_model_file_path = os.path.join('artifact', 'model.pkl')
+    n_jobs:int = -1     # core budget shared by the model searches, -1 uses every core this process may run on
+    search_checkpoint_dir:str = os.path.join('artifact', 'search_checkpoints')
+    search_strategy:str = 'grid'        # 'grid', 'halving', 'random' or 'staged'
+    search_max_fits:int = None          # total cv fits per model for the budgeted strategies
+    search_time_budget:float = None     # wall clock budget per model in seconds for the budgeted strategies
+    search_patience:int = 2             # 'staged': size levels without improvement before a candidate stops growing
+    grid_reference_path:str = os.path.join('artifact', 'grid_reference.json')
 
 class ModelTrainer:
     def __init__(self):
         self.model_trainer_config = ModelTrainingConfig()
+        self.search_details = {}
+        self.search_summary = {}
+        self.best_model_name = None
+        self.best_params = {}
+        self.execution_report = {}
 
-    def initiate_model_training(self, train_arr, test_arr):
+    def initiate_model_training(self, train_arr, test_arr, progress=None):
         try:
             logging.info('Split train and test data')
-            X_train, y_train, X_test, y_test = train_arr[:, :-1], train_arr[:, -1], test_arr[:, :-1], test_arr[:, -1]
+            if isinstance(train_arr, tuple):
+                # memory mapped (X, y) pairs from DataTransformation with persist_arrays
+                (X_train, y_train), (X_test, y_test) = train_arr, test_arr
+            else:
+                X_train, y_train, X_test, y_test = train_arr[:, :-1], train_arr[:, -1], test_arr[:, :-1], test_arr[:, -1]
 
             models = {
                 'Linear Regression': LinearRegression(),
@@ -38,7 +58,8 @@ class ModelTrainer:
                 'Decision Tree': DecisionTreeRegressor(),
                 'Random Forrest': RandomForestRegressor(),
                 'XGBRegressor': XGBRegressor(),
-                'CatBoostRegressor': CatBoostRegressor(verbose = False),
+                # iterations is passed explicitly so catboost reports it in get_params (halving grows it)
+                'CatBoostRegressor': CatBoostRegressor(verbose = False, iterations = 100),
                 'AdaBoostRegressor': AdaBoostRegressor(),
                 'Gradient Boost': GradientBoostingRegressor()
             }
@@ -80,7 +101,26 @@ class ModelTrainer:
                 'KNN': {}
             }
 
-            model_report:dict = evaluate_model(X_train= X_train, y_train = y_train, X_test = X_test, y_test = y_test, models = models, param=params)
+            config = self.model_trainer_config
+            self.search_details = {}
+            budget = ExecutionBudget(config.n_jobs)
+            with profile_stage('model_search', rows=len(X_train)) as stage, budget.measure():
+                model_report:dict = evaluate_model(X_train= X_train, y_train = y_train, X_test = X_test, y_test = y_test, models = models, param=params,
+                                                    n_jobs=config.n_jobs,
+                                                    checkpoint_dir=config.search_checkpoint_dir,
+                                                    search_strategy=config.search_strategy,
+                                                    max_fits=config.search_max_fits,
+                                                    time_budget=config.search_time_budget,
+                                                    details=self.search_details,
+                                                    progress=progress,
+                                                    patience=config.search_patience,
+                                                    budget=budget)
+            # cores, processes/threads per search and measured utilization of the search
+            self.execution_report = budget.plan
+            stage.update(budget.plan)
+            logging.info(f'Model search execution: {budget.plan}')
+
+            self.search_summary = self.compare_with_grid_reference(model_report, data_fingerprint(X_train, y_train, X_test, y_test))
 
             #best score
             best_score = max(list(model_report.values()))
@@ -97,11 +137,20 @@ class ModelTrainer:
                 raise CustomeException("No best Model Found")
             
             logging.info("Best model found on both train and test data")
+            self.best_model_name = best_performing_model
+            self.best_params = self.search_details.get(best_performing_model, {}).get('best_params', {})
 
-            save_object(
-                file_path=self.model_trainer_config.trained_model_file_path,
-                obj = final_model
-            )
+            with profile_stage('save_model'):
+                save_object(
+                    file_path=self.model_trainer_config.trained_model_file_path,
+                    obj = final_model
+                )
+                # tree ensembles also get a memory mappable array export that serving loads instead of the pickle
+                if export_trees(final_model, self.model_trainer_config.trained_model_file_path) is not None:
+                    logging.info(f'Exported {best_performing_model} trees as arrays')
+
+            # the run finished, so the per model checkpoints are no longer needed
+            clear_checkpoints(self.model_trainer_config.search_checkpoint_dir)
 
             predicted = final_model.predict(X_test)
 
@@ -110,4 +159,38 @@ class ModelTrainer:
             return score
 
         except Exception as e:
-            raise CustomeException(e, sys)
\ No newline at end of file
+            raise CustomeException(e, sys)
+
+    def compare_with_grid_reference(self, model_report, data_key):
+        '''
+        an exhaustive grid run stores its scores as the reference; a budgeted run reports
+        how far each model (and the best one) lands from that reference
+        '''
+        config = self.model_trainer_config
+        total_fits = sum(d['n_fits'] for d in self.search_details.values())
+
+        if config.search_strategy == 'grid':
+            os.makedirs(os.path.dirname(config.grid_reference_path), exist_ok=True)
+            with open(config.grid_reference_path, 'w') as file_obj:
+                json.dump({'data_key': data_key, 'total_fits': total_fits, 'scores': model_report}, file_obj, indent=2)
+            return {'strategy': 'grid', 'total_fits': total_fits}
+
+        summary = {'strategy': config.search_strategy, 'total_fits': total_fits}
+        if not os.path.exists(config.grid_reference_path):
+            logging.info('No full grid reference available to compare the budgeted search with')
+            return summary
+
+        with open(config.grid_reference_path) as file_obj:
+            reference = json.load(file_obj)
+
+        ref_scores = reference['scores']
+        summary['reference_same_data'] = reference['data_key'] == data_key
+        summary['reference_total_fits'] = reference['total_fits']
+        summary['gap_per_model'] = {
+            name: ref_scores[name] - score for name, score in model_report.items() if name in ref_scores
+        }
+        summary['best_gap'] = max(ref_scores.values()) - max(model_report.values())
+
+        logging.info(f"{config.search_strategy} search used {total_fits} fits vs {reference['total_fits']} for the full grid, "
+                     f"best r2 is {summary['best_gap']:.4f} below the grid reference")
+        return summary
\ No newline at end of file
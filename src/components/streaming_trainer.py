@@ -0,0 +1,236 @@
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.utils import save_object
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS
+from src.profiler import profile_stage
+
+TARGET_COLUMN = 'math_score'
+
+class PreprocessorStats:
+    '''
+    Exact sufficient statistics of the preprocessor, accumulated chunk by chunk:
+    a value -> count histogram and a null count per input column. The stud columns are
+    small categorical vocabularies and integer scores in 0..100, so the histograms stay
+    tiny whatever the row count, and medians, modes and scaler moments come out exact.
+    '''
+    def __init__(self, num_columns, cat_columns):
+        self.num_columns = list(num_columns)
+        self.cat_columns = list(cat_columns)
+        self.value_counts = {column: Counter() for column in self.num_columns + self.cat_columns}
+        self.null_counts = {column: 0 for column in self.value_counts}
+        self.n_rows = 0
+
+    def update(self, df):
+        for column in self.value_counts:
+            values = df[column]
+            # categorical dtypes (parquet artifacts) also list categories that do not occur
+            counts = values.value_counts(dropna=True)
+            self.value_counts[column].update(counts[counts > 0].to_dict())
+            self.null_counts[column] += int(values.isna().sum())
+        self.n_rows += len(df)
+
+    def add_counts(self, column, counts, nulls=0):
+        '''
+        adds a precomputed histogram, eg. the result of a GROUP BY query
+        '''
+        self.value_counts[column].update(counts)
+        self.null_counts[column] += int(nulls)
+
+    def median(self, column):
+        # same value SimpleImputer(strategy='median') computes: mean of the two middle values for an even count
+        values, counts = self._sorted(column)
+        cumulative = np.cumsum(counts)
+        n = cumulative[-1]
+        lower = values[np.searchsorted(cumulative, (n - 1) // 2 + 1)]
+        upper = values[np.searchsorted(cumulative, n // 2 + 1)]
+        return (lower + upper) / 2
+
+    def most_frequent(self, column):
+        # ties go to the smallest value, as in SimpleImputer(strategy='most_frequent')
+        counts = self.value_counts[column]
+        top = max(counts.values())
+        return min(value for value, count in counts.items() if count == top)
+
+    def imputed_moments(self, column, fill):
+        '''
+        mean and (population) variance of the column after its nulls are filled with fill
+        '''
+        values, counts = self._sorted(column)
+        values = np.append(values, fill)
+        counts = np.append(counts, self.null_counts[column])
+        n = counts.sum()
+        mean = (values * counts).sum() / n
+        var = (counts * (values - mean) ** 2).sum() / n
+        return mean, var, n
+
+    def _sorted(self, column):
+        items = sorted(self.value_counts[column].items())
+        return np.array([v for v, _ in items], dtype=np.float64), np.array([c for _, c in items], dtype=np.int64)
+
+
+def build_fitted_preprocessor(stats, preprocessor=None):
+    '''
+    the ColumnTransformer of DataTransformation with its fitted statistics set from stats,
+    equal to fitting it on all the rows the stats were built from
+    '''
+    try:
+        preprocessor = preprocessor or DataTransformation().get_data_transformer_object()
+
+        # fit once on a frame holding every category so the encoder and all fitted
+        # attributes exist, then overwrite the statistics with the exact ones
+        vocab = {column: sorted(set(stats.value_counts[column]) | {stats.most_frequent(column)})
+                 for column in stats.cat_columns}
+        n_synthetic = max(len(values) for values in vocab.values())
+        synthetic = pd.DataFrame({
+            **{column: [values[i % len(values)] for i in range(n_synthetic)] for column, values in vocab.items()},
+            **{column: np.arange(n_synthetic, dtype=np.float64) for column in stats.num_columns}
+        })[FEATURE_COLUMNS]
+        preprocessor.fit(synthetic)
+
+        transformers = {name: (pipeline, columns) for name, pipeline, columns in preprocessor.transformers_}
+        num_pipeline, num_columns = transformers['num_pipeline']
+        cat_pipeline, cat_columns = transformers['cat_pipeline']
+
+        num_imputer, num_scaler = num_pipeline.named_steps['imputer'], num_pipeline.named_steps['scaler']
+        medians = np.array([stats.median(column) for column in num_columns])
+        moments = [stats.imputed_moments(column, fill) for column, fill in zip(num_columns, medians)]
+        num_imputer.statistics_ = medians
+        _set_scaler(num_scaler, [m[0] for m in moments], [m[1] for m in moments], moments[0][2])
+
+        cat_imputer = cat_pipeline.named_steps['imputer']
+        encoder = cat_pipeline.named_steps['one_hot_encoder']
+        fills = [stats.most_frequent(column) for column in cat_columns]
+        cat_imputer.statistics_ = np.array(fills, dtype=object)
+
+        # a one hot column is 1 with the frequency p of its category: mean p, variance p * (1 - p)
+        shares = []
+        for column, fill, categories in zip(cat_columns, fills, encoder.categories_):
+            counts = stats.value_counts[column].copy()
+            counts[fill] += stats.null_counts[column]
+            total = sum(counts.values())
+            shares.extend(counts.get(category, 0) / total for category in categories)
+        shares = np.array(shares)
+        _set_scaler(cat_pipeline.named_steps['scaler'], shares, shares * (1 - shares), stats.n_rows)
+
+        return preprocessor
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+def _set_scaler(scaler, mean, var, n_samples):
+    var = np.asarray(var, dtype=np.float64)
+    scaler.mean_ = np.asarray(mean, dtype=np.float64)
+    scaler.var_ = var
+    # StandardScaler leaves constant columns unscaled
+    scale = np.sqrt(var)
+    scaler.scale_ = np.where(scale < 10 * np.finfo(scale.dtype).eps, 1.0, scale)
+    scaler.n_samples_seen_ = int(n_samples)
+
+
+@dataclass
+class StreamingTrainerConfig:
+    trained_model_file_path:str = os.path.join('artifact', 'model.pkl')
+    preprocessor_ob_file_path:str = os.path.join('artifact', 'preprocessor.pkl')
+    epochs:int = 5                  # passes of partial_fit over the training rows
+    test_percent:int = 20           # rows put in the holdout, scored after training
+    # integer key of the table: rows with key % 100 < test_percent are the holdout, a split the database
+    # computes as well (sql_stats). tables without it, like stud, are split by a hash of the whole row
+    key_column:str = 'id'
+    random_state:int = 42
+
+class StreamingTrainer:
+    '''
+    Trains without ever holding the table in memory: one chunked pass builds the preprocessor
+    statistics, then an incremental learner (any regressor with partial_fit, SGDRegressor by
+    default) is trained chunk by chunk for a few epochs and scored on a hash split holdout.
+    Peak memory is bounded by chunk_size. chunks is a callable returning a fresh iterator of
+    DataFrame chunks on every call, eg. lambda: ingestion.load_data_chunks(query, chunksize=...)
+    '''
+    def __init__(self, chunks, model=None, preprocessor=None):
+        self.streaming_trainer_config = StreamingTrainerConfig()
+        self.chunks = chunks
+        self.model = model
+        self.preprocessor = preprocessor        # already fitted, eg. from sql aggregates: skips the stats pass
+
+    def initiate_streaming_training(self):
+        try:
+            config = self.streaming_trainer_config
+            if self.model is None:
+                from sklearn.linear_model import SGDRegressor
+                self.model = SGDRegressor(random_state=config.random_state)
+
+            preprocessor = self.preprocessor or self._fit_preprocessor()
+
+            rng = np.random.default_rng(config.random_state)
+            for epoch in range(config.epochs):
+                with profile_stage(f'partial_fit_epoch_{epoch}'):
+                    for chunk in self.chunks():
+                        chunk = chunk[~self._is_holdout(chunk)]
+                        if len(chunk) == 0:
+                            continue
+                        order = rng.permutation(len(chunk))
+                        X = preprocessor.transform(chunk[FEATURE_COLUMNS])[order]
+                        self.model.partial_fit(X, chunk[TARGET_COLUMN].to_numpy(dtype=np.float64)[order])
+                logging.info(f'Streaming training epoch {epoch + 1}/{config.epochs} done')
+
+            with profile_stage('holdout_eval') as stage:
+                score, stage['rows'] = self._holdout_r2(preprocessor)
+            logging.info(f'Streaming model holdout r2 {score:.4f}')
+
+            with profile_stage('save_model'):
+                save_object(config.preprocessor_ob_file_path, preprocessor)
+                save_object(config.trained_model_file_path, self.model)
+
+            return score
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def _fit_preprocessor(self):
+        preprocessor = DataTransformation().get_data_transformer_object()
+        feature_columns = {name: columns for name, _, columns in preprocessor.transformers}
+        stats = PreprocessorStats(feature_columns['num_pipeline'], feature_columns['cat_pipeline'])
+
+        with profile_stage('stats_pass') as stage:
+            for chunk in self.chunks():
+                stats.update(chunk[~self._is_holdout(chunk)])
+            stage['rows'] = stats.n_rows
+        logging.info(f'Preprocessor statistics built from {stats.n_rows} rows in one pass')
+
+        return build_fitted_preprocessor(stats, preprocessor)
+
+    def _holdout_r2(self, preprocessor):
+        # r2 from running sums, so the holdout is never materialized either
+        n = sum_y = sum_y2 = sse = 0.0
+        for chunk in self.chunks():
+            chunk = chunk[self._is_holdout(chunk)]
+            if len(chunk) == 0:
+                continue
+            y = chunk[TARGET_COLUMN].to_numpy(dtype=np.float64)
+            predicted = self.model.predict(preprocessor.transform(chunk[FEATURE_COLUMNS]))
+            n += len(y)
+            sum_y += y.sum()
+            sum_y2 += (y ** 2).sum()
+            sse += ((y - predicted) ** 2).sum()
+
+        if n == 0:
+            return float('nan'), 0
+        return 1 - sse / (sum_y2 - sum_y ** 2 / n), int(n)
+
+    def _is_holdout(self, chunk):
+        config = self.streaming_trainer_config
+        if config.key_column in chunk.columns:
+            # same predicate as DataIngestion.load_value_counts(holdout=...)
+            return chunk[config.key_column] % 100 < config.test_percent
+        keys = chunk[FEATURE_COLUMNS + [TARGET_COLUMN]].astype(str).agg('|'.join, axis=1)
+        return DataIngestion.hash_split(keys, config.test_percent)
@@ -0,0 +1,171 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+
+# thread pool sizes read by OpenMP/BLAS runtimes when they are first loaded
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# constructor parameter that sizes each library's own thread pool
+THREAD_PARAMS = {
+    'XGBRegressor': 'n_jobs',
+    'CatBoostRegressor': 'thread_count',
+    'RandomForestRegressor': 'n_jobs',
+    'ExtraTreesRegressor': 'n_jobs',
+    'KNeighborsRegressor': 'n_jobs',
+    'LinearRegression': 'n_jobs'
+}
+
+# what a fitted model is saved with: sklearn n_jobs=None is one job, so a random forest sums its
+# trees in a fixed order at serving time; xgboost uses its own default
+SERVING_THREADS = {'n_jobs': None}
+
+# models whose parameters cannot be changed once fitted. catboost's predict takes its own
+# thread_count (all cores by default), the training thread count is not used at serving time
+FROZEN_WHEN_FITTED = {'CatBoostRegressor'}
+
+
+def available_cores():
+    '''
+    the cores this process may use: its cpu affinity, capped by a cgroup cpu quota (containers)
+    '''
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cores = min(cores, max(1, math.ceil(quota)))
+    return cores
+
+def _cgroup_cpu_quota():
+    # cgroup v2 cpu.max is "<quota> <period>" or "max <period>"; v1 splits them into two files
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as file_obj:
+            quota, period = file_obj.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as file_obj:
+            quota = int(file_obj.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as file_obj:
+            period = int(file_obj.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+class ExecutionBudget:
+    '''
+    Splits one core budget between the levels of parallelism of a training run: concurrent
+    model searches (processes), the fits inside a search (GridSearchCV n_jobs) and the threads
+    of a single estimator (XGBoost n_jobs, CatBoost thread_count, sklearn n_jobs, BLAS/OpenMP).
+    At every level cores = parallel tasks x threads per task, so nothing is oversubscribed.
+    '''
+    def __init__(self, cores=None):
+        self.cores = available_cores() if cores in (None, -1) else max(1, min(int(cores), available_cores()))
+        self.plan = {}
+
+    @staticmethod
+    def split(cores, n_tasks):
+        '''
+        (tasks run in parallel, threads per task) for n_tasks independent tasks on cores
+        '''
+        parallel = max(1, min(cores, n_tasks))
+        return parallel, max(1, cores // parallel)
+
+    def plan_searches(self, n_models):
+        workers, cores_per_worker = self.split(self.cores, n_models)
+        self.plan.update({'cores': self.cores, 'search_workers': workers, 'cores_per_worker': cores_per_worker})
+        return workers, cores_per_worker
+
+    @contextmanager
+    def measure(self):
+        '''
+        records wall time, cpu time of this process and its descendants (search workers and their
+        joblib children) and utilization = cpu / (wall x cores)
+        '''
+        wall, cpu = time.perf_counter(), process_tree_cpu_seconds()
+        try:
+            yield self.plan
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = process_tree_cpu_seconds() - cpu
+            self.plan.update({
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu, 6),
+                'utilization': round(cpu / (wall * self.cores), 4) if wall > 0 else None
+            })
+
+
+def configure_estimator(model, threads):
+    '''
+    sets the estimator's own thread pool to threads, returns whether it has one
+    '''
+    # no get_params() membership check: catboost only reports parameters it was built with,
+    # and an unset thread_count means one thread per host core
+    param = THREAD_PARAMS.get(type(model).__name__)
+    if param is None:
+        return False
+    model.set_params(**{param: threads})
+    return True
+
+def reset_estimator_threads(model):
+    '''
+    puts the thread parameter set for the search back to the library default before the model is saved
+    '''
+    name = type(model).__name__
+    param = THREAD_PARAMS.get(name)
+    if param is not None and name not in FROZEN_WHEN_FITTED:
+        model.set_params(**{param: SERVING_THREADS[param]})
+
+def limit_worker_threads(threads):
+    '''
+    initializer of the search worker processes: caps the OpenMP/BLAS pools before XGBoost,
+    CatBoost or numpy's BLAS start their threads, and again through threadpoolctl for
+    runtimes that are already loaded
+    '''
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+def process_tree_cpu_seconds():
+    '''
+    cpu seconds of this process, its reaped children and every live descendant. a descendant's time
+    moves into its parent's children time when it is reaped, so differences of this value count
+    each process of the run once; other processes on the host are not counted
+    '''
+    times = os.times()
+    total = times.user + times.system + times.children_user + times.children_system
+    try:
+        parents = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as file_obj:
+                        # the command name may contain spaces, the fields after it do not
+                        fields = file_obj.read().rsplit(')', 1)[1].split()
+                except OSError:
+                    continue
+                parents[int(entry)] = (int(fields[1]), fields)
+
+        descendants, frontier = set(), {os.getpid()}
+        while frontier:
+            frontier = {pid for pid, (ppid, _) in parents.items() if ppid in frontier} - descendants
+            descendants |= frontier
+
+        ticks = os.sysconf('SC_CLK_TCK')
+        for pid in descendants:
+            fields = parents[pid][1]
+            # utime, stime, cutime, cstime
+            total += sum(int(v) for v in fields[11:15]) / ticks
+    except (OSError, ValueError):
+        pass    # no /proc: own and reaped children time only
+    return total
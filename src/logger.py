@@ -1,21 +1,180 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+try:
+    import fcntl
+except ImportError:     # windows: no cross process lock, every process rotates on its own
+    fcntl = None
 
-# Create ONLY the logs directory
-logs_path = os.path.join(os.getcwd(), 'logs')
-os.makedirs(logs_path, exist_ok=True)
+# everything is configured from the environment, eg. LOG_LEVEL=WARNING for serving replicas
+#   LOG_LEVEL          root level (default INFO, also used for an unknown level name)
+#   LOG_LEVELS         per logger overrides, eg. "sqlalchemy.engine=WARNING,src.pipelines=DEBUG"
+#   LOG_DIR            directory of app.log (default ./logs)
+#   LOG_MAX_BYTES      rotate when app.log reaches this size (default 10MB)
+#   LOG_ROTATE_HOURS   rotate at least this often, 0 disables (default 24)
+#   LOG_BACKUP_COUNT   rotated files kept, app.log.1 .. app.log.N (default 10)
+logs_path = os.environ.get('LOG_DIR', os.path.join(os.getcwd(), 'logs'))
+LOG_FILE_PATH = os.path.join(logs_path, 'app.log')
 
-# Now create the full file path inside that directory
-LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE)
+# attributes every LogRecord has; anything else was passed through extra= and goes into the json
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format='[ %(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+
+class JsonFormatter(logging.Formatter):
+    '''
+    one json object per line: time, level, logger, source location, process, message and any extra= fields
+    '''
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'lineno': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+
+        return json.dumps(entry, default=str)
+
+
+class SizeTimeRotatingFileHandler(RotatingFileHandler):
+    '''
+    RotatingFileHandler that also rolls over every interval_s seconds and that every process
+    writing app.log can share (app, serving workers, training and its pool workers): rollovers
+    run under an exclusive lock on app.log.lock, whose mtime is the time of the last rollover,
+    and a process reopens the file once another one has rotated it, as WatchedFileHandler does.
+    backups are numbered app.log.1 .. app.log.<backup_count>, so size and time rollovers share
+    one retention limit
+    '''
+    def __init__(self, filename, max_bytes, backup_count, interval_s):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval_s = interval_s
+        self.lock_path = f'{self.baseFilename}.lock'
+        if not os.path.exists(self.lock_path):
+            open(self.lock_path, 'a').close()
+
+    def emit(self, record):
+        self._reopen_if_rotated()
+        super().emit(record)
+
+    def shouldRollover(self, record):
+        # the file size on disk, not this process's write offset: other processes append as well
+        try:
+            size = os.path.getsize(self.baseFilename)
+        except OSError:
+            return False
+        if self.maxBytes > 0 and size >= self.maxBytes:
+            return True
+        return bool(self.interval_s) and size > 0 and time.time() - os.path.getmtime(self.lock_path) >= self.interval_s
+
+    def doRollover(self):
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # another process may have rotated the file while this one waited for the lock
+                self._reopen_if_rotated()
+                if self.shouldRollover(None):
+                    super().doRollover()
+                    os.utime(self.lock_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            # delay=True: the next emit opens the new app.log
+            self.stream.close()
+            self.stream = None
+
+
+class _QueueHandler(QueueHandler):
+    # formats the message in the calling thread (args may not be safe to share) but leaves
+    # the json rendering and the file write to the listener thread
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler():
+    return SizeTimeRotatingFileHandler(
+        LOG_FILE_PATH,
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 10)),
+        interval_s=float(os.environ.get('LOG_ROTATE_HOURS', 24)) * 3600
+    )
+
+
+def setup_logging():
+    '''
+    routes the root logger through a queue to a background thread that writes json lines to
+    logs/app.log. log calls only put a record on the queue, and calls below the configured
+    level return before a record is even created. safe to call more than once per process
+    '''
+    root = logging.getLogger()
+    if getattr(root, '_queue_listener', None) is not None:
+        return root._queue_listener
+
+    os.makedirs(logs_path, exist_ok=True)
+    file_handler = _file_handler()
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(_QueueHandler(log_queue))
+    invalid = []
+    root.setLevel(_level(os.environ.get('LOG_LEVEL', 'INFO'), logging.INFO, invalid))
+    for override in filter(None, os.environ.get('LOG_LEVELS', '').split(',')):
+        name, _, level = override.partition('=')
+        level = _level(level, None, invalid)
+        if level is not None:
+            logging.getLogger(name.strip()).setLevel(level)
+    for level in invalid:
+        logging.getLogger(__name__).warning(f'Unknown log level {level!r} ignored, LOG_LEVEL falls back to INFO')
+
+    root._queue_listener = listener
+    return listener
+
+
+def _level(name, default, invalid):
+    # 'warning', 'DEBUG' or a number; anything else is reported and replaced by default
+    name = name.strip().upper()
+    if name.isdigit():
+        return int(name)
+    if isinstance(logging.getLevelName(name), int):
+        return name
+    invalid.append(name)
+    return default
+
+
+setup_logging()
 
 if __name__ == "__main__":
     logging.info('Logging has started')
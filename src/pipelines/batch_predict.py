@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.pipelines.predict_pipeline import PredictPipeline
+
+PREDICTION_COLUMN = 'predicted_math_score'
+
+
+def score_file(input_path, output_path, chunk_size=None, keep_inputs=True):
+    '''
+    streams input_path (csv or parquet) through the prediction pipeline chunk by chunk and
+    writes the predictions to output_path (csv or parquet, chosen by extension).
+    returns the number of rows scored
+    '''
+    try:
+        predict_pipeline = PredictPipeline()
+        writer = _open_writer(output_path)
+        rows = 0
+
+        try:
+            for chunk, prediction in predict_pipeline.iter_predictions(input_path, chunk_size=chunk_size):
+                out = chunk.copy() if keep_inputs else chunk.iloc[:, :0].copy()
+                out[PREDICTION_COLUMN] = prediction
+                writer.write(out)
+                rows += len(out)
+                logging.info(f'Scored {rows} rows from {input_path}')
+        finally:
+            writer.close()
+
+        return rows
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+
+def _open_writer(output_path):
+    dir_path = os.path.dirname(output_path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+
+    if output_path.endswith('.parquet'):
+        return _ParquetChunkWriter(output_path)
+    return _CsvChunkWriter(output_path)
+
+
+class _CsvChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header_written = False
+
+    def write(self, df):
+        df.to_csv(self.path, mode='a' if self.header_written else 'w', header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        pass
+
+
+class _ParquetChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a csv/parquet file of students with the trained model')
+    parser.add_argument('input', help='input csv or parquet file')
+    parser.add_argument('output', help='output csv or parquet file for the predictions')
+    parser.add_argument('--chunk-size', type=int, default=None, help='rows scored per chunk')
+    parser.add_argument('--predictions-only', action='store_true', help='write only the prediction column')
+    args = parser.parse_args(argv)
+
+    rows = score_file(args.input, args.output, chunk_size=args.chunk_size, keep_inputs=not args.predictions_only)
+    print(f'Scored {rows} rows -> {args.output}')
+
+
+if __name__ == "__main__":
+    main()
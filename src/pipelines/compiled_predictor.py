@@ -0,0 +1,185 @@
+import sys
+import threading
+
+import numpy as np
+
+from src.exception import CustomeException
+from src.artifact_cache import artifact_cache, file_digest
+from src.pipelines.tree_predictor import load_model_with_digest
+
+
+class CompiledPredictor:
+    '''
+    Lean array version of the fitted preprocessor + model.
+    The medians, category vocabularies and scaler vectors of the ColumnTransformer built by
+    DataTransformation.get_data_transformer_object are pulled out into flat NumPy tables, and
+    inputs are encoded with the same floating point operations sklearn uses, so predictions
+    are bit for bit the same. A LinearRegression model reduces to a dot product; any other
+    model gets the encoded array through its own predict.
+    '''
+    def __init__(self, num_columns, num_fill, num_mean, num_scale,
+                 cat_columns, cat_fill, cat_vocab, cat_inv_scale, handle_unknown,
+                 model, coef=None, intercept=None):
+        self.num_columns = list(num_columns)
+        self.num_fill = np.asarray(num_fill, dtype=np.float64)
+        self.num_mean = np.asarray(num_mean, dtype=np.float64)
+        self.num_scale = np.asarray(num_scale, dtype=np.float64)
+
+        self.cat_columns = list(cat_columns)
+        self.cat_fill = list(cat_fill)
+        self.cat_vocab = [dict(vocab) for vocab in cat_vocab]       # value -> column index in the feature matrix
+        self.cat_inv_scale = np.asarray(cat_inv_scale, dtype=np.float64)
+        self.handle_unknown = handle_unknown
+
+        self.n_features = len(self.num_columns) + len(self.cat_inv_scale)
+        self.model = model
+        self.coef = None if coef is None else np.asarray(coef, dtype=np.float64)
+        self.intercept = intercept
+
+    @classmethod
+    def from_objects(cls, preprocessor, model):
+        '''
+        builds the lookup tables from a fitted ColumnTransformer and model
+        '''
+        try:
+            transformers = {name: (pipeline, columns) for name, pipeline, columns in preprocessor.transformers_
+                            if name != 'remainder'}
+            num_pipeline, num_columns = transformers['num_pipeline']
+            cat_pipeline, cat_columns = transformers['cat_pipeline']
+
+            num_imputer, num_scaler = num_pipeline.named_steps['imputer'], num_pipeline.named_steps['scaler']
+            cat_imputer = cat_pipeline.named_steps['imputer']
+            encoder = cat_pipeline.named_steps['one_hot_encoder']
+            cat_scaler = cat_pipeline.named_steps['scaler']
+
+            n_num = len(num_columns)
+            num_mean = num_scaler.mean_ if num_scaler.with_mean else np.zeros(n_num)
+            num_scale = num_scaler.scale_ if num_scaler.with_std else np.ones(n_num)
+
+            # one hot columns follow the numeric block; each category maps straight to its column
+            cat_vocab, offset = [], n_num
+            for categories in encoder.categories_:
+                cat_vocab.append({value: offset + i for i, value in enumerate(categories)})
+                offset += len(categories)
+
+            n_onehot = offset - n_num
+            cat_scale = cat_scaler.scale_ if cat_scaler.with_std else np.ones(n_onehot)
+
+            coef = intercept = None
+            if type(model).__name__ == 'LinearRegression' and np.ndim(model.coef_) == 1:
+                coef, intercept = model.coef_, model.intercept_
+
+            return cls(
+                num_columns = num_columns,
+                num_fill = num_imputer.statistics_,
+                num_mean = num_mean,
+                num_scale = num_scale,
+                cat_columns = cat_columns,
+                cat_fill = cat_imputer.statistics_,
+                cat_vocab = cat_vocab,
+                # the scaler multiplies the sparse one hot output by 1 / scale_
+                cat_inv_scale = 1 / cat_scale,
+                handle_unknown = encoder.handle_unknown,
+                model = model,
+                coef = coef,
+                intercept = intercept
+            )
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def transform(self, input_data):
+        '''
+        encodes a DataFrame (or dict of columns) into the same float64 matrix the ColumnTransformer produces
+        '''
+        n_rows = len(input_data[self.num_columns[0]])
+        X = np.zeros((n_rows, self.n_features))
+
+        for j, column in enumerate(self.num_columns):
+            values = np.asarray(input_data[column], dtype=np.float64)
+            values = np.where(np.isnan(values), self.num_fill[j], values)
+            X[:, j] = (values - self.num_mean[j]) / self.num_scale[j]
+
+        rows = np.arange(n_rows)
+        for j, column in enumerate(self.cat_columns):
+            vocab = self.cat_vocab[j]
+            index = np.fromiter((self._category_index(vocab, value, j) for value in input_data[column]),
+                                dtype=np.int64, count=n_rows)
+            known = index >= 0
+            X[rows[known], index[known]] = self.cat_inv_scale[index[known] - len(self.num_columns)]
+
+        return X
+
+    def transform_row(self, row):
+        '''
+        single row fast path: row is a mapping of column -> value, no pandas involved
+        '''
+        x = np.zeros((1, self.n_features))
+
+        for j, column in enumerate(self.num_columns):
+            value = row[column]
+            value = self.num_fill[j] if value is None or value != value else np.float64(value)
+            x[0, j] = (value - self.num_mean[j]) / self.num_scale[j]
+
+        for j, column in enumerate(self.cat_columns):
+            index = self._category_index(self.cat_vocab[j], row[column], j)
+            if index >= 0:
+                x[0, index] = self.cat_inv_scale[index - len(self.num_columns)]
+
+        return x
+
+    def _category_index(self, vocab, value, j):
+        # SimpleImputer(missing_values=np.nan) only imputes NaN; None is a value the encoder
+        # does not know, as in sklearn
+        if value != value:
+            value = self.cat_fill[j]
+        index = vocab.get(value)
+        if index is None:
+            if self.handle_unknown == 'error':
+                raise ValueError(f'Found unknown category {value!r} in column {self.cat_columns[j]!r}')
+            return -1
+        return index
+
+    def predict_array(self, X):
+        if self.coef is not None:
+            # same expression LinearRegression.predict evaluates
+            return X @ self.coef + self.intercept
+        return self.model.predict(X)
+
+    def predict(self, input_data):
+        try:
+            return self.predict_array(self.transform(input_data))
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def predict_row(self, row):
+        try:
+            return self.predict_array(self.transform_row(row))[0]
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_predictor(model_path, preprocessor_path):
+    '''
+    compiled predictor for the current artifacts, rebuilt only when either file's content changes
+    '''
+    # content hashes, so checking for a new model never unpickles it
+    key = (file_digest(model_path), file_digest(preprocessor_path))
+
+    predictor = _compiled.get(key)
+    if predictor is None:
+        # keyed on the digests of the bytes actually unpickled: a file replaced after the check
+        # above must not be cached under the old hash
+        model, model_digest = load_model_with_digest(model_path)
+        preprocessor, preprocessor_digest = artifact_cache.get_with_digest(preprocessor_path)
+        predictor = CompiledPredictor.from_objects(preprocessor=preprocessor, model=model)
+        key = (model_digest, preprocessor_digest)
+        with _compiled_lock:
+            _compiled.clear()       # only the current model pair is kept
+            _compiled[key] = predictor
+
+    return predictor
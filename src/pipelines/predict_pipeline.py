@@ -1,29 +1,205 @@
+import os
 import sys
-import pandas as pd
+from dataclasses import dataclass
+
+import numpy as np
 
 from src.exception import CustomeException
-from src.utils import load_object
+from src.artifact_cache import load_cached_object
+from src.pipelines.tree_predictor import load_model
+from src.pipelines.compiled_predictor import get_compiled_predictor
+from src.pipelines.shared_model import get_shared_model
+from src.components.model_registry import ModelRegistry
+
+FEATURE_COLUMNS = [
+    'gender',
+    'race_ethnicity',
+    'parental_level_of_education',
+    'lunch',
+    'test_preparation_course',
+    'reading_score',
+    'writing_score'
+]
+
+@dataclass
+class PredictPipelineConfig:
+    model_path:str = os.path.join('artifact', 'model.pkl')
+    preprocessor_path:str = os.path.join('artifact', 'preprocessor.pkl')
+    batch_chunk_size:int = 50_000
+    use_compiled:bool = True        # score through CompiledPredictor instead of the sklearn objects
+    use_registry:bool = True        # serve the registry's active version when there is one
+    registry_dir:str = os.path.join('artifact', 'registry')
+    model_version:str = None        # pin a registry version, eg. to compare two models side by side
+    # score with the model a SharedModelPublisher put in this directory (read only, shared by all workers)
+    shared_model_dir:str = os.environ.get('SHARED_MODEL_DIR')
 
 class PredictPipeline:
-    def __init__(self):
-        pass
+    def __init__(self, model_version=None):
+        self.predict_pipeline_config = PredictPipelineConfig()
+        self.predict_pipeline_config.model_version = model_version
+        self.model_registry = ModelRegistry(self.predict_pipeline_config.registry_dir)
+
+    def artifact_paths(self):
+        '''
+        (model path, preprocessor path) to serve: the pinned or active registry version,
+        falling back to artifact/model.pkl and artifact/preprocessor.pkl
+        '''
+        config = self.predict_pipeline_config
+        if config.use_registry:
+            paths = self.model_registry.artifact_paths(config.model_version)
+            if paths is not None:
+                return paths
+        return config.model_path, config.preprocessor_path
+
+    def input_frame(self, columns):
+        '''
+        model input for a dict of column -> values: passed through as is to the compiled predictor,
+        so serving never builds a DataFrame, and as a DataFrame to the sklearn objects
+        '''
+        if self.predict_pipeline_config.use_compiled:
+            return columns
+
+        import pandas as pd
+        return pd.DataFrame(columns)[FEATURE_COLUMNS]
 
     def predict(self, input_data):
         try: 
-            model_path = 'artifact/model.pkl'
-            preprocessor_path = 'artifact/preprocessor.pkl'
-            
-            model = load_object(file_path=model_path)
-            preprocessor = load_object(file_path=preprocessor_path)
+            return self._scorer()(input_data)
+        
+        except Exception as e:
+            raise CustomeException(e, sys)
 
-            data_scaled = preprocessor.fit_transform(input_data)
-            prediction = model.predict(data_scaled)
+    def predict_row(self, row):
+        '''
+        scores a single row given as a mapping of column -> value, eg. CustomData.get_data_as_dict()
+        '''
+        try:
+            if self.predict_pipeline_config.use_compiled:
+                return self._compiled_predictor().predict_row(row)
+
+            import pandas as pd
+            return self.predict(pd.DataFrame({column: [row[column]] for column in FEATURE_COLUMNS}))[0]
 
-            return prediction
-        
         except Exception as e:
             raise CustomeException(e, sys)
 
+    def _scorer(self):
+        # artifacts are unpickled once per process and reused until the files change
+        if self.predict_pipeline_config.use_compiled:
+            return self._compiled_predictor().predict
+
+        model_path, preprocessor_path = self.artifact_paths()
+
+        model = load_model(model_path)
+        preprocessor = load_cached_object(file_path=preprocessor_path)
+        return lambda input_data: model.predict(preprocessor.transform(input_data))
+
+    def _compiled_predictor(self):
+        config = self.predict_pipeline_config
+        model_path, preprocessor_path = self.artifact_paths()
+        if config.shared_model_dir and config.model_version is None:
+            # only when the published generation matches the artifacts that are being served
+            predictor = get_shared_model(config.shared_model_dir, model_path, preprocessor_path)
+            if predictor is not None:
+                return predictor
+        return get_compiled_predictor(model_path, preprocessor_path)
+
+    def known_categories(self):
+        '''
+        {categorical column: accepted values} of the served encoder; a column maps to None when the
+        encoder ignores unknown values. missing values are always accepted, they are imputed
+        '''
+        try:
+            if self.predict_pipeline_config.use_compiled:
+                predictor = self._compiled_predictor()
+                strict = predictor.handle_unknown == 'error'
+                return {column: set(vocab) if strict else None
+                        for column, vocab in zip(predictor.cat_columns, predictor.cat_vocab)}
+
+            preprocessor = load_cached_object(file_path=self.artifact_paths()[1])
+            transformers = {name: (pipeline, columns) for name, pipeline, columns in preprocessor.transformers_}
+            cat_pipeline, cat_columns = transformers['cat_pipeline']
+            encoder = cat_pipeline.named_steps['one_hot_encoder']
+            strict = encoder.handle_unknown == 'error'
+            return {column: set(categories.tolist()) if strict else None
+                    for column, categories in zip(cat_columns, encoder.categories_)}
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def predict_batch(self, input_data, chunk_size=None):
+        '''
+        scores a whole cohort and returns a 1-d array of predictions.
+        input_data can be a DataFrame, a NumPy record/structured array or a path to a csv/parquet file.
+        rows are scored in chunks, with a single preprocessor pass per chunk
+        '''
+        try:
+            predictions = [
+                prediction for _, prediction in self.iter_predictions(input_data, chunk_size=chunk_size)
+            ]
+            if not predictions:
+                return np.empty(0)
+
+            return np.concatenate(predictions)
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def iter_predictions(self, input_data, chunk_size=None):
+        '''
+        generator yielding (chunk_df, predictions) pairs, so callers can stream results out without
+        holding the whole input in memory
+        '''
+        chunk_size = chunk_size or self.predict_pipeline_config.batch_chunk_size
+        scorer = self._scorer()
+
+        for chunk in iter_input_chunks(input_data, chunk_size):
+            yield chunk, np.asarray(scorer(chunk[FEATURE_COLUMNS])).ravel()
+
+
+def iter_input_chunks(input_data, chunk_size):
+    '''
+    yields DataFrame chunks of at most chunk_size rows from a DataFrame, a NumPy record array
+    or a csv/parquet/arrow file path. files are read lazily, so memory is bounded by chunk_size
+    '''
+    import pandas as pd
+
+    if isinstance(input_data, pd.DataFrame):
+        for start in range(0, len(input_data), chunk_size):
+            yield input_data.iloc[start:start + chunk_size]
+
+    elif isinstance(input_data, np.ndarray):
+        if input_data.dtype.names is None:
+            raise ValueError('NumPy input must be a record/structured array with named fields')
+        for start in range(0, len(input_data), chunk_size):
+            yield pd.DataFrame.from_records(input_data[start:start + chunk_size])
+
+    elif isinstance(input_data, (str, os.PathLike)):
+        path = os.fspath(input_data)
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        elif path.endswith('.arrow'):
+            import pyarrow as pa
+
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(path, chunksize=chunk_size):
+                yield chunk
+
+    else:
+        raise TypeError(f'Unsupported input type for batch prediction: {type(input_data).__name__}')
+
+def rows_to_columns(rows):
+    # json null is a missing value: NaN is what the imputers treat as missing, None is not
+    return {column: [np.nan if row.get(column) is None else row[column] for row in rows] for column in FEATURE_COLUMNS}
+
 class CustomData:
     def __init__(self, 
                  gender:str, 
@@ -42,6 +218,23 @@ class CustomData:
         self.reading_score = reading_score
         self.writing_score = writing_score
 
+    def to_key(self):
+        '''
+        normalized, hashable tuple of the inputs in FEATURE_COLUMNS order, used as a cache key
+        '''
+        key = []
+        for column in FEATURE_COLUMNS:
+            value = getattr(self, column)
+            if isinstance(value, str):
+                value = value.strip()
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            key.append(value)
+        return tuple(key)
+
+    def get_data_as_dict(self):
+        return {column: getattr(self, column) for column in FEATURE_COLUMNS}
+
     def get_data_as_dataframe(self):
         try:
             custum_data_input_dict = {
@@ -54,6 +247,7 @@ class CustomData:
                 'writing_score': [self.writing_score]
             }
 
+            import pandas as pd
             return pd.DataFrame(custum_data_input_dict)
         except Exception as e:
             raise CustomeException(e, sys)
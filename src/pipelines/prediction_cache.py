@@ -0,0 +1,162 @@
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS, PredictPipeline
+from src.artifact_cache import file_digest, load_cached_object
+
+CATEGORICAL_FEATURES = FEATURE_COLUMNS[:5]
+SCORE_RANGE = 101       # reading/writing scores are integers in 0..100
+
+
+class PredictionCache:
+    '''
+    LRU + TTL memo of predictions keyed on the normalized CustomData tuple.
+    Every lookup checks the content hash of the model and preprocessor, so a newly trained
+    model clears the cache automatically. With use_lookup_table the whole discrete input space
+    (every category combination x every reading/writing score) is scored once into a float64
+    array and served by indexing, so a table hit returns exactly what the model predicts.
+    '''
+    def __init__(self, max_size=10_000, ttl=3600, use_lookup_table=False, predict_pipeline=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.use_lookup_table = use_lookup_table
+        self.predict_pipeline = predict_pipeline or PredictPipeline()
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # key -> (prediction, expires at)
+        self._model_version = None
+        self._table = None
+        self._table_index = None            # per categorical feature: value -> axis position
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def model_version(self):
+        model_path, preprocessor_path = self.predict_pipeline.artifact_paths()
+        return (file_digest(model_path), file_digest(preprocessor_path))
+
+    def predict(self, custom_data):
+        '''
+        prediction for a CustomData, from the lookup table or memo when possible
+        '''
+        try:
+            key = custom_data.to_key()
+            self._check_version()
+
+            if self.use_lookup_table:
+                if self._table is None:
+                    self.build_lookup_table()
+                value = self._lookup(key)
+                if value is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return value
+
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+            value = float(self.predict_pipeline.predict_row(dict(zip(FEATURE_COLUMNS, key))))
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (value, now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+            return value
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def _check_version(self):
+        version = self.model_version()
+        if version != self._model_version:
+            with self._lock:
+                if self._model_version is not None:
+                    self.invalidations += 1
+                    logging.info('Model changed, prediction cache cleared')
+                self._entries.clear()
+                self._table = None
+                self._table_index = None
+                self._model_version = version
+
+    def build_lookup_table(self):
+        '''
+        scores every (categorical combination, reading score, writing score) cell, about 2.4M
+        cells for the stud vocabularies, into a float64 array of ~20MB (the dtype of the
+        model's own predictions, so lookups and scoring agree bit for bit)
+        '''
+        try:
+            preprocessor = load_cached_object(self.predict_pipeline.artifact_paths()[1])
+            encoder = preprocessor.named_transformers_['cat_pipeline'].named_steps['one_hot_encoder']
+            cat_columns = next(columns for name, _, columns in preprocessor.transformers_ if name == 'cat_pipeline')
+
+            vocab = {column: list(categories) for column, categories in zip(cat_columns, encoder.categories_)}
+            values = [vocab[column] for column in CATEGORICAL_FEATURES]
+            shape = tuple(len(v) for v in values) + (SCORE_RANGE, SCORE_RANGE)
+            table = np.empty(shape, dtype=np.float64)
+
+            reading, writing = np.meshgrid(np.arange(SCORE_RANGE), np.arange(SCORE_RANGE), indexing='ij')
+            reading, writing = reading.ravel(), writing.ravel()
+
+            # one vectorized call per category combination (10201 score pairs each)
+            for index in itertools.product(*(range(len(v)) for v in values)):
+                columns = {
+                    **{column: np.repeat(values[j][index[j]], len(reading)) for j, column in enumerate(CATEGORICAL_FEATURES)},
+                    'reading_score': reading,
+                    'writing_score': writing
+                }
+                table[index] = np.asarray(self.predict_pipeline.predict(self.predict_pipeline.input_frame(columns))).reshape(SCORE_RANGE, SCORE_RANGE)
+
+            with self._lock:
+                self._table = table
+                self._table_index = [{value: i for i, value in enumerate(v)} for v in values]
+            logging.info(f'Prediction lookup table built with {table.size} cells')
+
+            return table
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def _lookup(self, key):
+        table, table_index = self._table, self._table_index
+        if table is None:
+            return None
+
+        position = []
+        for j, value in enumerate(key[:5]):
+            i = table_index[j].get(value)
+            if i is None:
+                return None
+            position.append(i)
+
+        for score in key[5:]:
+            if not isinstance(score, int) or not 0 <= score < SCORE_RANGE:
+                return None
+            position.append(score)
+
+        return float(table[tuple(position)])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'lookup_table_cells': 0 if self._table is None else int(self._table.size)
+            }
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.logger import logging
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS, PredictPipeline, rows_to_columns
+
+
+@dataclass
+class PredictionServerConfig:
+    batch_window_ms:float = 5.0     # how long the first queued request waits for others to join its batch
+    max_batch_size:int = 1024       # rows scored in one vectorized call
+    latency_window:int = 10_000     # requests kept for the p50/p99 figures
+
+
+class MicroBatcher:
+    '''
+    Coalesces concurrent requests into one vectorized PredictPipeline call.
+    A batch is flushed when it reaches max_batch_size rows or when batch_window_ms has
+    passed since its first request arrived. When a batch fails its requests are scored one
+    by one, so a bad request only fails itself.
+    '''
+    def __init__(self, predict_pipeline, config):
+        self.predict_pipeline = predict_pipeline
+        self.config = config
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.batches = 0
+        self.batched_rows = 0
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            n_rows = len(items[0][0])
+            deadline = loop.time() + self.config.batch_window_ms / 1000
+
+            while n_rows < self.config.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n_rows += len(item[0])
+
+            await self._score(items)
+
+    async def _score(self, items):
+        rows = [row for item_rows, _ in items for row in item_rows]
+        try:
+            frame = self.predict_pipeline.input_frame(rows_to_columns(rows))
+            # scoring is CPU bound, keep it off the event loop
+            predictions = await asyncio.get_running_loop().run_in_executor(
+                None, self.predict_pipeline.predict, frame
+            )
+            predictions = np.asarray(predictions, dtype=float).ravel()
+        except Exception as e:
+            if len(items) > 1:
+                for item in items:
+                    await self._score([item])
+                return
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_rows += len(rows)
+
+        start = 0
+        for item_rows, future in items:
+            if not future.done():
+                future.set_result(predictions[start:start + len(item_rows)].tolist())
+            start += len(item_rows)
+
+
+class LatencyStats:
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def record(self, seconds, rows):
+        self.latencies.append(seconds)
+        self.requests += 1
+        self.rows += rows
+
+    def snapshot(self):
+        uptime = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            'requests': self.requests,
+            'rows': self.rows,
+            'errors': self.errors,
+            'uptime_s': round(uptime, 3),
+            'throughput_rows_per_s': round(self.rows / uptime, 3) if uptime > 0 else 0.0,
+            'latency_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'latency_p99_ms': round(float(np.percentile(latencies, 99)), 3)
+        }
+
+
+class PredictionServer:
+    '''
+    Minimal ASGI app serving the trained model.
+
+        POST /predict        one student as a json object      -> {"prediction": float}
+        POST /predict/batch  {"rows": [...]} or a json list    -> {"predictions": [float, ...]}
+        GET  /metrics        latency percentiles, throughput and batching counters
+        GET  /health
+
+    Malformed bodies get 400, values the model cannot score (unknown categories, non numeric scores) 422.
+    '''
+    def __init__(self, config=None, predict_pipeline=None):
+        self.config = config or PredictionServerConfig()
+        self.predict_pipeline = predict_pipeline or PredictPipeline()
+        self.stats = LatencyStats(self.config.latency_window)
+        self.batcher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self._ensure_started()
+                    # load the artifacts now so the first request does not pay for unpickling
+                    self.predict_pipeline.predict(self.predict_pipeline.input_frame(rows_to_columns([self._example_row()])))
+                    logging.info('Prediction server started, model loaded')
+                except Exception as e:
+                    logging.info(f'Prediction server could not warm the model: {e}')
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.batcher is not None:
+                    await self.batcher.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _ensure_started(self):
+        if self.batcher is None:
+            self.batcher = MicroBatcher(self.predict_pipeline, self.config)
+            self.batcher.start()
+
+    @staticmethod
+    def _example_row():
+        return {
+            'gender': 'female',
+            'race_ethnicity': 'group B',
+            "parental_level_of_education": "bachelor's degree",
+            'lunch': 'standard',
+            'test_preparation_course': 'none',
+            'reading_score': 72,
+            'writing_score': 74
+        }
+
+    async def _http(self, scope, receive, send):
+        method, path = scope['method'], scope['path'].rstrip('/') or '/'
+
+        if method == 'GET' and path == '/health':
+            return await self._respond(send, 200, {'status': 'ok'})
+        if method == 'GET' and path == '/metrics':
+            metrics = self.stats.snapshot()
+            if self.batcher is not None:
+                metrics['batches'] = self.batcher.batches
+                metrics['mean_batch_rows'] = round(self.batcher.batched_rows / max(1, self.batcher.batches), 3)
+            return await self._respond(send, 200, metrics)
+        if method == 'POST' and path in ('/predict', '/predict/batch'):
+            return await self._predict(path, receive, send)
+
+        return await self._respond(send, 404, {'error': f'no route for {method} {path}'})
+
+    async def _predict(self, path, receive, send):
+        start = time.perf_counter()
+        try:
+            payload = json.loads(await self._read_body(receive) or b'null')
+            single = path == '/predict'
+            rows = [payload] if single else (payload.get('rows') if isinstance(payload, dict) else payload)
+            self._validate(rows)
+        except (ValueError, AttributeError) as e:
+            self.stats.errors += 1
+            return await self._respond(send, 400, {'error': str(e)})
+
+        try:
+            self._check_values(rows, self.predict_pipeline.known_categories())
+        except ValueError as e:
+            self.stats.errors += 1
+            return await self._respond(send, 422, {'error': str(e)})
+        except Exception as e:
+            # the model could not be loaded; scoring reports that below
+            logging.info(f'Could not read the model vocabularies: {e}')
+
+        try:
+            self._ensure_started()
+            predictions = await self.batcher.submit(rows)
+        except Exception as e:
+            self.stats.errors += 1
+            logging.info(f'Prediction failed: {e}')
+            return await self._respond(send, 500, {'error': str(e)})
+
+        self.stats.record(time.perf_counter() - start, len(rows))
+        body = {'prediction': predictions[0]} if single else {'predictions': predictions}
+        return await self._respond(send, 200, body)
+
+    @staticmethod
+    def _validate(rows):
+        if not isinstance(rows, list) or not rows:
+            raise ValueError('expected a json object per student (or a non empty list of them)')
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ValueError('every student must be a json object')
+            missing = [column for column in FEATURE_COLUMNS if column not in row]
+            if missing:
+                raise ValueError(f'missing fields: {missing}')
+
+    @staticmethod
+    def _check_values(rows, categories):
+        '''
+        rejects values the model cannot score: non numeric scores and categories the encoder does not know
+        '''
+        for i, row in enumerate(rows):
+            for column in FEATURE_COLUMNS:
+                value = row[column]
+                if value is None:
+                    continue
+                if column in categories:
+                    known = categories[column]
+                    if not isinstance(value, str) or (known is not None and value not in known):
+                        raise ValueError(f'row {i}: unknown {column} {value!r}')
+                elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f'row {i}: {column} must be a number, got {value!r}')
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return body
+
+    @staticmethod
+    async def _respond(send, status, body):
+        payload = json.dumps(body).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+app = PredictionServer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve math score predictions over http')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--batch-window-ms', type=float, default=PredictionServerConfig.batch_window_ms)
+    parser.add_argument('--max-batch-size', type=int, default=PredictionServerConfig.max_batch_size)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    server = PredictionServer(PredictionServerConfig(batch_window_ms=args.batch_window_ms, max_batch_size=args.max_batch_size))
+    uvicorn.run(server, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.artifact_cache import artifact_cache, file_digest, load_cached_object
+from src.pipelines.compiled_predictor import CompiledPredictor
+from src.pipelines.tree_predictor import TREE_ARRAYS, TreePredictor, flatten_trees, load_model_with_digest
+
+PREDICTOR_ARRAYS = ('num_fill', 'num_mean', 'num_scale', 'cat_inv_scale')
+
+def default_shared_dir():
+    # /dev/shm is a tmpfs: files there are plain named shared memory
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'student_marks_model')
+    return os.path.join('artifact', 'shared')
+
+@dataclass
+class SharedModelConfig:
+    shared_dir:str = os.environ.get('SHARED_MODEL_DIR') or default_shared_dir()
+    keep_generations:int = 2        # older generations are deleted; workers that still map them keep their pages
+
+class SharedModelPublisher:
+    '''
+    Loader side: unpickles the artifacts once, turns them into a CompiledPredictor and writes
+    its arrays (scaler vectors, coefficients or tree arrays) plus a json of the vocabularies to
+    <shared_dir>/gen-<n>/. The GENERATION file is then swapped atomically; workers see the new
+    model on their next prediction. Models that have no array form (KNN, XGBoost, CatBoost)
+    are referenced by path and still unpickled by each worker.
+    '''
+    def __init__(self, shared_dir=None):
+        self.shared_model_config = SharedModelConfig()
+        if shared_dir is not None:
+            self.shared_model_config.shared_dir = shared_dir
+
+    def publish(self, model_path, preprocessor_path):
+        try:
+            shared_dir = self.shared_model_config.shared_dir
+            os.makedirs(shared_dir, exist_ok=True)
+
+            # digests of the bytes actually loaded, the files may be replaced meanwhile
+            model, model_digest = load_model_with_digest(model_path)
+            preprocessor, preprocessor_digest = artifact_cache.get_with_digest(preprocessor_path)
+            predictor = CompiledPredictor.from_objects(preprocessor, model)
+
+            # mkdir fails on an existing directory: a concurrent publisher that read the same
+            # generation takes the next number instead of writing into (or deleting) this one
+            generation = (read_generation(shared_dir) or {}).get('generation', 0) + 1
+            while True:
+                gen_dir = os.path.join(shared_dir, f'gen-{generation}')
+                try:
+                    os.mkdir(gen_dir)
+                    break
+                except FileExistsError:
+                    generation += 1
+
+            arrays = {name: getattr(predictor, name) for name in PREDICTOR_ARRAYS}
+            meta = {
+                'num_columns': list(predictor.num_columns),
+                'cat_columns': list(predictor.cat_columns),
+                'cat_fill': [str(value) for value in predictor.cat_fill],
+                'cat_vocab': [{str(value): int(index) for value, index in vocab.items()} for vocab in predictor.cat_vocab],
+                'handle_unknown': predictor.handle_unknown,
+                'model_digest': model_digest,
+                'preprocessor_digest': preprocessor_digest
+            }
+
+            if predictor.coef is not None:
+                meta['model'] = 'linear'
+                meta['intercept'] = float(predictor.intercept)
+                arrays['coef'] = predictor.coef
+            elif isinstance(model, TreePredictor) or flatten_trees(model) is not None:
+                if isinstance(model, TreePredictor):
+                    tree_arrays, manifest = {name: getattr(model, name) for name in TREE_ARRAYS}, model.manifest
+                else:
+                    tree_arrays, manifest = flatten_trees(model)
+                meta['model'] = 'trees'
+                meta['tree_manifest'] = manifest
+                arrays.update({f'tree_{name}': arr for name, arr in tree_arrays.items()})
+            else:
+                meta['model'] = 'pickle'
+                meta['model_path'] = os.path.abspath(model_path)
+
+            for name, arr in arrays.items():
+                np.save(os.path.join(gen_dir, f'{name}.npy'), np.ascontiguousarray(arr))
+            with open(os.path.join(gen_dir, 'meta.json'), 'w') as file_obj:
+                json.dump(meta, file_obj)
+
+            write_generation(shared_dir, {'generation': generation, 'dir': f'gen-{generation}',
+                                          'model_digest': meta['model_digest'],
+                                          'preprocessor_digest': meta['preprocessor_digest'],
+                                          'published_at': time.time()})
+            self._remove_old_generations(generation)
+            logging.info(f"Published shared model generation {generation} ({meta['model']}) to {shared_dir}")
+
+            return generation
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def watch(self, artifact_paths, interval=5.0):
+        '''
+        publishes whenever the artifacts returned by artifact_paths() change content,
+        eg. artifact_paths=PredictPipeline().artifact_paths to follow the registry's active version
+        '''
+        published = None
+        while True:
+            model_path, preprocessor_path = artifact_paths()
+            if os.path.exists(model_path) and os.path.exists(preprocessor_path):
+                digests = (file_digest(model_path), file_digest(preprocessor_path))
+                if digests != published:
+                    self.publish(model_path, preprocessor_path)
+                    published = digests
+            time.sleep(interval)
+
+    def _remove_old_generations(self, generation):
+        shared_dir = self.shared_model_config.shared_dir
+        for name in os.listdir(shared_dir):
+            if name.startswith('gen-') and name[4:].isdigit():
+                if int(name[4:]) <= generation - self.shared_model_config.keep_generations:
+                    shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+class SharedModelClient:
+    '''
+    Worker side: attaches to the published generation read only (memory mapped, so every worker
+    on the host shares the same pages) and re-attaches when the generation file changes.
+    A generation that fails to attach is skipped and the previous predictor stays in use.
+    '''
+    def __init__(self, shared_dir=None):
+        self.shared_dir = shared_dir or SharedModelConfig().shared_dir
+        self._lock = threading.Lock()
+        self._signature = None
+        self._predictor = None
+        self.generation = None
+        self.digests = None         # (model, preprocessor) digests of the attached generation
+
+    def predictor(self):
+        '''
+        CompiledPredictor of the current generation, or None when nothing has been published
+        '''
+        path = os.path.join(self.shared_dir, 'GENERATION')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        # every publish replaces the file, so the inode changes even within one mtime tick
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    try:
+                        pointer = read_generation(self.shared_dir)
+                        predictor = attach(os.path.join(self.shared_dir, pointer['dir']))
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        # generation removed or half written: keep serving the one attached before
+                        # and retry on the next call
+                        logging.info(f'Could not attach shared model generation: {e}')
+                        return self._predictor
+                    self._predictor = predictor
+                    self.generation = pointer['generation']
+                    self.digests = (pointer.get('model_digest'), pointer.get('preprocessor_digest'))
+                    self._signature = signature
+                    logging.info(f'Attached shared model generation {self.generation}')
+        return self._predictor
+
+
+def attach(gen_dir):
+    with open(os.path.join(gen_dir, 'meta.json')) as file_obj:
+        meta = json.load(file_obj)
+
+    def mapped(name):
+        return np.load(os.path.join(gen_dir, f'{name}.npy'), mmap_mode='r')
+
+    coef = intercept = model = None
+    if meta['model'] == 'linear':
+        coef, intercept = mapped('coef'), meta['intercept']
+    elif meta['model'] == 'trees':
+        model = TreePredictor(meta['tree_manifest'], {name: mapped(f'tree_{name}') for name in TREE_ARRAYS})
+    else:
+        model = load_cached_object(meta['model_path'])
+
+    return CompiledPredictor(
+        num_columns = meta['num_columns'],
+        num_fill = mapped('num_fill'),
+        num_mean = mapped('num_mean'),
+        num_scale = mapped('num_scale'),
+        cat_columns = meta['cat_columns'],
+        cat_fill = meta['cat_fill'],
+        cat_vocab = [vocab.items() for vocab in meta['cat_vocab']],
+        cat_inv_scale = mapped('cat_inv_scale'),
+        handle_unknown = meta['handle_unknown'],
+        model = model,
+        coef = coef,
+        intercept = intercept
+    )
+
+def read_generation(shared_dir):
+    path = os.path.join(shared_dir, 'GENERATION')
+    if not os.path.exists(path):
+        return None
+    with open(path) as file_obj:
+        return json.load(file_obj)
+
+def write_generation(shared_dir, pointer):
+    path = os.path.join(shared_dir, 'GENERATION')
+    tmp_path = f'{path}.tmp_{os.getpid()}'
+    with open(tmp_path, 'w') as file_obj:
+        json.dump(pointer, file_obj)
+    os.replace(tmp_path, path)
+
+
+_clients = {}
+
+def get_shared_model(shared_dir, model_path=None, preprocessor_path=None):
+    '''
+    the shared predictor, or None when nothing is published or, given the artifact paths being
+    served, when the published generation was built from other artifacts (eg. the registry was
+    switched and the publisher has not caught up yet)
+    '''
+    client = _clients.get(shared_dir)
+    if client is None:
+        client = _clients.setdefault(shared_dir, SharedModelClient(shared_dir))
+    predictor = client.predictor()
+    if predictor is None or model_path is None:
+        return predictor
+
+    model_digest, preprocessor_digest = client.digests
+    if model_digest != file_digest(model_path):
+        return None
+    if preprocessor_path is not None and preprocessor_digest is not None and preprocessor_digest != file_digest(preprocessor_path):
+        return None
+    return predictor
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from src.pipelines.predict_pipeline import PredictPipeline
+
+    parser = argparse.ArgumentParser(description='Publish the served model into shared memory for worker processes')
+    parser.add_argument('--shared-dir', default=None)
+    parser.add_argument('--watch', action='store_true', help='keep running and republish when the model changes')
+    parser.add_argument('--interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    publisher = SharedModelPublisher(args.shared_dir)
+    pipeline = PredictPipeline()
+    if args.watch:
+        publisher.watch(pipeline.artifact_paths, args.interval)
+    else:
+        print(publisher.publish(*pipeline.artifact_paths()))
@@ -1,22 +1,199 @@
+import os
+import time
+
 from src.components.data_ingestion import DataIngestion
 from src.components.data_transformation import DataTransformation
 from src.components.model_trainer import ModelTrainer
+from src.components.streaming_trainer import StreamingTrainer
+from src.components.incremental_linear import IncrementalLinearTrainer
+from src.components.model_registry import ModelRegistry
+from src.logger import logging
+from src.profiler import StageProfiler
+
+def run_training_pipeline(search_strategy=None, search_max_fits=None, search_time_budget=None, incremental=False,
+                          output_dir=None, progress=None, metadata=None, profile=True, watermark_column=None):
+    '''
+    runs ingestion, transformation and training. search_strategy overrides the trainer's
+    default ('grid'); 'halving' or 'random' with a budget trade a little r2 for a much faster run,
+    'staged' searches the full grid but scores all ensemble sizes of a candidate from one growing fit.
+    incremental=True only pulls rows added since the last ingestion, past the stud column
+    watermark_column (an AUTO_INCREMENT id or insert timestamp, required for incremental runs).
+    output_dir writes preprocessor.pkl/model.pkl there instead of over the served artifacts,
+    otherwise the new pair is also registered and activated.
+    progress(stage, fraction) is called between stages and after every model search.
+    a metadata dict, if given, is filled with what the model registry records about the run.
+    with profile=True a per stage timing report is written to artifact/profiles/
+    '''
+    metadata = {} if metadata is None else metadata
+    if not profile:
+        result = _run_training_pipeline(search_strategy, search_max_fits, search_time_budget, incremental,
+                                        output_dir, progress, metadata, watermark_column)
+    else:
+        profiler = StageProfiler('training')
+        with profiler.activate():
+            result = _run_training_pipeline(search_strategy, search_max_fits, search_time_budget, incremental,
+                                            output_dir, progress, metadata, watermark_column)
+
+        report_path = profiler.save()
+        logging.info(f'Training profile written to {report_path}\n{profiler.summary_table()}')
+        metadata['profile_report'] = report_path
+
+    if output_dir is None:
+        config = ModelTrainer().model_trainer_config
+        register_artifacts(config.trained_model_file_path, DataTransformation().data_transformation_config.preprocessor_ob_file_path, metadata)
 
-def run_training_pipeline():
-    
+    return result
+
+def register_artifacts(model_path, preprocessor_path, metadata=None):
+    '''
+    registers and activates a pair written over the served artifacts: once the registry has an
+    active version serving follows ACTIVE.json, and would otherwise keep the previous model
+    '''
+    return ModelRegistry().register(model_path, preprocessor_path, metadata, activate=True)
+
+def run_streaming_training_pipeline(chunk_size=50_000, epochs=5, output_dir=None, profile=True, sql_stats=False):
+    '''
+    out of core alternative to run_training_pipeline for tables larger than memory: the stud
+    table is streamed from mysql in chunk_size row chunks for every pass, and an SGDRegressor
+    is trained with partial_fit instead of the full model search.
+    sql_stats=True fits the preprocessor from GROUP BY counts run in the database instead of a
+    first streaming pass. the database leaves out the holdout rows by the same key % 100 split, so
+    it needs the integer key column of StreamingTrainerConfig in the table
+    '''
     obj = DataIngestion(
-        host='127.0.0.1', 
-        user='root', 
-        password='', 
+        host='127.0.0.1',
+        user='root',
+        password='',
         database='mlproject1'
     )
 
+    trainer = StreamingTrainer(lambda: obj.load_data_chunks('SELECT * FROM stud', chunksize=chunk_size))
+    config = trainer.streaming_trainer_config
+    if sql_stats:
+        trainer.preprocessor = DataTransformation().get_data_transformer_object_from_sql(
+            obj, holdout=(config.key_column, config.test_percent)
+        )
+    config.epochs = epochs
+    if output_dir is not None:
+        config.trained_model_file_path = os.path.join(output_dir, 'model.pkl')
+        config.preprocessor_ob_file_path = os.path.join(output_dir, 'preprocessor.pkl')
+
+    if not profile:
+        result = trainer.initiate_streaming_training()
+    else:
+        profiler = StageProfiler('streaming_training')
+        with profiler.activate():
+            result = trainer.initiate_streaming_training()
+        logging.info(f'Training profile written to {profiler.save()}\n{profiler.summary_table()}')
+
+    if output_dir is None:
+        register_artifacts(config.trained_model_file_path, config.preprocessor_ob_file_path,
+                           {'model_name': type(trainer.model).__name__, 'r2': result, 'search_strategy': 'streaming'})
+
+    return result
+
+def run_incremental_linear_pipeline(watermark_column, output_dir=None):
+    '''
+    near real time refresh of a linear model: pulls the rows added since the last ingestion
+    (past watermark_column), folds only those into the persisted sufficient statistics and refits
+    preprocessor and LinearRegression in closed form. the result equals a full refit on every
+    ingested train row
+    '''
+    obj = DataIngestion(
+        host='127.0.0.1',
+        user='root',
+        password='',
+        database='mlproject1'
+    )
+    obj.ingestion_config.watermark_column = watermark_column
+    train_dir, _ = obj.initiate_incremental_ingestion()
+
+    trainer = IncrementalLinearTrainer()
+    if output_dir is not None:
+        config = trainer.incremental_linear_config
+        config.trained_model_file_path = os.path.join(output_dir, 'model.pkl')
+        config.preprocessor_ob_file_path = os.path.join(output_dir, 'preprocessor.pkl')
+
+    new_rows = trainer.refresh(train_dir)
+    if output_dir is None:
+        config = trainer.incremental_linear_config
+        register_artifacts(config.trained_model_file_path, config.preprocessor_ob_file_path,
+                           {'model_name': 'LinearRegression', 'data_watermark': obj.read_watermark(),
+                            'search_strategy': 'incremental_linear'})
+
+    return new_rows
+
+def _run_training_pipeline(search_strategy, search_max_fits, search_time_budget, incremental,
+                           output_dir, progress, metadata, watermark_column):
+    start = time.perf_counter()
+    report = progress or (lambda stage, fraction: None)
+
+    obj = DataIngestion(
+        host='127.0.0.1',
+        user='root',
+        password='',
+        database='mlproject1'
+    )
+
+    report('ingestion', 0.0)
+    obj.ingestion_config.incremental = incremental
+    if watermark_column is not None:
+        obj.ingestion_config.watermark_column = watermark_column
     train_data, test_data= obj.initiate_data_ingestion()
 
+    report('transformation', 0.1)
     data_transformation = DataTransformation()
+    if output_dir is not None:
+        data_transformation.data_transformation_config.preprocessor_ob_file_path = os.path.join(output_dir, 'preprocessor.pkl')
     train_arr, test_arr, _ = data_transformation.initiate_data_transformation(train_data, test_data)
 
+    report('training', 0.2)
     model_trainer = ModelTrainer()
-    result = model_trainer.initiate_model_training(train_arr, test_arr)
+    if output_dir is not None:
+        model_trainer.model_trainer_config.trained_model_file_path = os.path.join(output_dir, 'model.pkl')
+    if search_strategy is not None:
+        model_trainer.model_trainer_config.search_strategy = search_strategy
+        model_trainer.model_trainer_config.search_max_fits = search_max_fits
+        model_trainer.model_trainer_config.search_time_budget = search_time_budget
+    result = model_trainer.initiate_model_training(
+        train_arr, test_arr,
+        progress=lambda name, done, total: report(f'searched {name}' if name else 'searching', 0.2 + 0.75 * done / total)
+    )
+
+    if metadata is not None:
+        metadata.update({
+            'data_watermark': obj.read_watermark() if incremental else None,
+            'model_name': model_trainer.best_model_name,
+            'best_params': model_trainer.best_params,
+            'r2': result,
+            'search_strategy': model_trainer.model_trainer_config.search_strategy,
+            'train_time_s': round(time.perf_counter() - start, 3)
+        })
+
+    report('done', 1.0)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Train the math score model')
+    parser.add_argument('--mode', choices=['full', 'incremental', 'streaming', 'incremental-linear'], default='full',
+                        help='incremental modes only pull the rows past the stored watermark')
+    parser.add_argument('--strategy', default=None, help="search strategy: 'grid', 'halving', 'random' or 'staged'")
+    parser.add_argument('--max-fits', type=int, default=None)
+    parser.add_argument('--time-budget', type=float, default=None)
+    parser.add_argument('--watermark-column', default=None,
+                        help='stud column that grows with every insert, required by the incremental modes')
+    args = parser.parse_args()
+
+    if args.mode in ('incremental', 'incremental-linear') and args.watermark_column is None:
+        parser.error(f'--mode {args.mode} needs --watermark-column')
 
-    return result
\ No newline at end of file
+    if args.mode == 'streaming':
+        print(run_streaming_training_pipeline())
+    elif args.mode == 'incremental-linear':
+        print(run_incremental_linear_pipeline(args.watermark_column))
+    else:
+        print(run_training_pipeline(args.strategy, args.max_fits, args.time_budget, incremental=args.mode == 'incremental',
+                                    watermark_column=args.watermark_column))
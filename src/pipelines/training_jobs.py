@@ -0,0 +1,163 @@
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+from src.exception import CustomeException
+from src.logger import logging
+from src.pipelines.shared_model import SharedModelPublisher
+from src.components.model_registry import ModelRegistry
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+class TrainingJob:
+    def __init__(self, kwargs):
+        self.id = uuid.uuid4().hex[:12]
+        self.kwargs = kwargs
+        self.status = 'queued'          # queued, running, succeeded, failed, cancelled
+        self.stage = None
+        self.progress = 0.0
+        self.result = None
+        self.version = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'result': self.result,
+            'version': self.version,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class TrainingJobManager:
+    '''
+    Runs run_training_pipeline in a background thread, one job at a time.
+    Submitting while a job is running returns the running job (single flight).
+    The job trains into a staging directory and only publishes once training succeeded:
+    the pair is registered in the model registry and activated with one atomic pointer
+    swap. artifact/model.pkl and artifact/preprocessor.pkl are not touched, two file renames
+    could be seen half done; PredictPipeline reads the active registry version.
+    '''
+    def __init__(self, artifact_dir='artifact'):
+        self.artifact_dir = artifact_dir
+        self.staging_root = os.path.join(artifact_dir, 'staging')
+        self.model_registry = ModelRegistry(os.path.join(artifact_dir, 'registry'))
+        self._lock = threading.Lock()
+        self._job = None
+
+    def submit(self, **kwargs):
+        '''
+        starts a training job with run_training_pipeline keyword arguments, unless one is already running
+        '''
+        with self._lock:
+            if self._job is not None and not self._job.done:
+                return self._job
+
+            job = TrainingJob(kwargs)
+            self._job = job
+
+        threading.Thread(target=self._run, args=(job,), name=f'training-{job.id}', daemon=True).start()
+        return job
+
+    def status(self):
+        job = self._job
+        return None if job is None else job.to_dict()
+
+    def cancel(self):
+        '''
+        requests cancellation; the job stops at its next stage boundary, and model searches running in
+        worker processes are terminated within about a second
+        '''
+        job = self._job
+        if job is None or job.done:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _run(self, job):
+        # imported here so that the serving process only pays for the trainer when it trains
+        from src.pipelines.train_pipeline import run_training_pipeline
+
+        staging_dir = os.path.join(self.staging_root, job.id)
+        job.status, job.started_at = 'running', time.time()
+
+        def progress(stage, fraction):
+            if job.cancel_event.is_set():
+                raise TrainingCancelled(f'training job {job.id} cancelled')
+            job.stage, job.progress = stage, fraction
+
+        try:
+            os.makedirs(staging_dir, exist_ok=True)
+            metadata = {}
+            job.result = run_training_pipeline(output_dir=staging_dir, progress=progress, metadata=metadata, **job.kwargs)
+
+            if job.cancel_event.is_set():
+                raise TrainingCancelled(f'training job {job.id} cancelled')
+
+            job.version = self.publish(staging_dir, metadata)
+            job.status = 'succeeded'
+            logging.info(f'Training job {job.id} finished with r2 {job.result}')
+            self.publish_shared(job.version)
+
+        except Exception as e:
+            if job.cancel_event.is_set():
+                job.status = 'cancelled'
+                logging.info(f'Training job {job.id} cancelled')
+            else:
+                job.status, job.error = 'failed', str(e)
+                logging.info(f'Training job {job.id} failed: {e}')
+
+        finally:
+            job.finished_at = time.time()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def publish(self, staging_dir, metadata=None):
+        '''
+        registers the staged pair and activates it (one atomic pointer swap), returns the registry version
+        '''
+        try:
+            return self.model_registry.register(
+                model_path = os.path.join(staging_dir, 'model.pkl'),
+                preprocessor_path = os.path.join(staging_dir, 'preprocessor.pkl'),
+                metadata = metadata
+            )
+
+        except Exception as e:
+            raise CustomeException(e, sys)
+
+    def publish_shared(self, version):
+        '''
+        moves workers attached to shared memory to the new generation. the version is already
+        active, so a failure here is logged and the job still succeeded: workers keep the previous
+        generation until the next publish
+        '''
+        shared_dir = os.environ.get('SHARED_MODEL_DIR')
+        if not shared_dir:
+            return
+        try:
+            SharedModelPublisher(shared_dir).publish(*self.model_registry.artifact_paths(version))
+        except Exception as e:
+            logging.info(f'Publishing model version {version} to shared memory failed: {e}')
+
+
+training_jobs = TrainingJobManager()
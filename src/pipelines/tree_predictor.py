@@ -0,0 +1,235 @@
+import json
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+
+from src.exception import CustomeException
+from src.artifact_cache import artifact_cache, file_digest
+
+TREE_EXPORT_DIR = 'model_trees'
+TREE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'offsets')
+
+# how the per tree outputs are combined, by model class
+TREE_MODELS = {
+    'DecisionTreeRegressor': 'tree',
+    'RandomForestRegressor': 'forest',
+    'ExtraTreesRegressor': 'forest',
+    'GradientBoostingRegressor': 'boosting',
+    'AdaBoostRegressor': 'adaboost'
+}
+
+
+def tree_export_dir(model_path):
+    return os.path.join(os.path.dirname(model_path), TREE_EXPORT_DIR)
+
+def flatten_trees(model):
+    '''
+    (arrays, manifest) with every tree of a fitted ensemble laid end to end in flat node arrays,
+    or None for models that are not tree ensembles
+    '''
+    kind = TREE_MODELS.get(type(model).__name__)
+    if kind is None:
+        return None
+
+    manifest = {'kind': kind, 'model_class': type(model).__name__, 'n_features': int(model.n_features_in_)}
+    if kind == 'tree':
+        trees = [model]
+    elif kind == 'forest':
+        trees = list(model.estimators_)
+    elif kind == 'boosting':
+        trees = [stage[0] for stage in model.estimators_]
+        if isinstance(model.init_, str) and model.init_ == 'zero':
+            manifest['init'] = 0.0
+        elif type(model.init_).__name__ == 'DummyRegressor':
+            manifest['init'] = float(np.ravel(model.init_.constant_)[0])
+        else:
+            return None     # a custom init estimator cannot be reduced to a constant
+        manifest['learning_rate'] = float(model.learning_rate)
+    else:
+        trees = list(model.estimators_)
+        manifest['estimator_weights'] = np.asarray(model.estimator_weights_, dtype=np.float64).tolist()
+
+    if any(tree.tree_.n_outputs != 1 for tree in trees):
+        return None
+
+    offsets = np.cumsum([0] + [tree.tree_.node_count for tree in trees]).astype(np.int64)
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        t = tree.tree_
+        is_leaf = t.children_left < 0
+        # children become global node indices; leaves keep -1 and point feature 0 (never read)
+        feature.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        left.append(np.where(is_leaf, -1, t.children_left + offset).astype(np.int64))
+        right.append(np.where(is_leaf, -1, t.children_right + offset).astype(np.int64))
+        value.append(t.value[:, 0, 0].astype(np.float64))
+
+    arrays = {
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'value': np.concatenate(value),
+        'offsets': offsets
+    }
+    manifest['n_trees'] = len(trees)
+    manifest['max_depth'] = int(max(tree.tree_.max_depth for tree in trees))
+
+    return arrays, manifest
+
+def export_trees(model, model_path):
+    '''
+    writes the flattened trees of model next to model_path (<dir>/model_trees/*.npy and
+    manifest.json, tagged with model_path's content hash) and returns the directory;
+    returns None and removes any stale export when model is not a tree ensemble
+    '''
+    try:
+        export_dir = tree_export_dir(model_path)
+        flat = flatten_trees(model)
+        if flat is None:
+            shutil.rmtree(export_dir, ignore_errors=True)
+            return None
+
+        arrays, manifest = flat
+        manifest['model_digest'] = file_digest(model_path)
+
+        tmp_dir = f'{export_dir}.tmp_{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(arr))
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+
+        replace_dir(tmp_dir, export_dir)
+        return export_dir
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+def replace_dir(src_dir, target_dir):
+    # a directory cannot be os.replace'd over a non empty one: move the old one aside first.
+    # processes that mapped the old arrays keep reading them until they reload
+    old_dir = f'{target_dir}.old_{os.getpid()}'
+    if os.path.isdir(target_dir):
+        os.replace(target_dir, old_dir)
+    os.replace(src_dir, target_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class TreePredictor:
+    '''
+    Array form of a fitted DecisionTree/RandomForest/GradientBoosting/AdaBoost regressor.
+    All trees are walked at once, one depth level per step, with the comparisons sklearn makes
+    (float32 inputs against float64 thresholds), and the per tree outputs are combined in the
+    same order as sklearn, so predictions are bit for bit the same. The arrays are memory
+    mapped: loading reads the manifest only, and workers on one host share the pages.
+    '''
+    def __init__(self, manifest, arrays, chunk_cells=1 << 22):
+        self.manifest = manifest
+        for name in TREE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_trees = manifest['n_trees']
+        self.roots = np.asarray(self.offsets[:-1])
+        self.chunk_rows = max(1, chunk_cells // self.n_trees)
+
+    @classmethod
+    def load(cls, export_dir):
+        with open(os.path.join(export_dir, 'manifest.json')) as file_obj:
+            manifest = json.load(file_obj)
+        arrays = {name: np.load(os.path.join(export_dir, f'{name}.npy'), mmap_mode='r') for name in TREE_ARRAYS}
+        return cls(manifest, arrays)
+
+    def tree_outputs(self, X):
+        '''
+        (n_samples, n_trees) leaf values
+        '''
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.manifest['n_features']:
+            raise ValueError(f"X has shape {X.shape}, the model expects {self.manifest['n_features']} features")
+
+        outputs = np.empty((len(X), self.n_trees))
+        for start in range(0, len(X), self.chunk_rows):
+            chunk = X[start:start + self.chunk_rows]
+            rows = np.arange(len(chunk))[:, None]
+            nodes = np.broadcast_to(self.roots, (len(chunk), self.n_trees)).copy()
+            for _ in range(self.manifest['max_depth']):
+                left = self.left[nodes]
+                is_leaf = left < 0
+                if is_leaf.all():
+                    break
+                go_left = chunk[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(is_leaf, nodes, np.where(go_left, left, self.right[nodes]))
+            outputs[start:start + len(chunk)] = self.value[nodes]
+        return outputs
+
+    def predict(self, X):
+        outputs = self.tree_outputs(X)
+        kind = self.manifest['kind']
+
+        if kind == 'tree':
+            return outputs[:, 0]
+
+        if kind == 'forest':
+            # RandomForestRegressor adds the trees one after another, then divides
+            prediction = np.zeros(len(outputs))
+            for t in range(self.n_trees):
+                prediction += outputs[:, t]
+            prediction /= self.n_trees
+            return prediction
+
+        if kind == 'boosting':
+            prediction = np.full(len(outputs), self.manifest['init'], dtype=np.float64)
+            learning_rate = self.manifest['learning_rate']
+            for t in range(self.n_trees):
+                prediction += learning_rate * outputs[:, t]
+            return prediction
+
+        # AdaBoostRegressor: weighted median of the estimator predictions
+        weights = np.asarray(self.manifest['estimator_weights'])
+        sorted_idx = np.argsort(outputs, axis=1)
+        weight_cdf = np.cumsum(weights[sorted_idx], axis=1, dtype=np.float64)
+        median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis]
+        median_idx = median_or_above.argmax(axis=1)
+        median_estimators = sorted_idx[np.arange(len(outputs)), median_idx]
+        return outputs[np.arange(len(outputs)), median_estimators]
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def load_model(model_path):
+    '''
+    the model to score with: the memory mapped TreePredictor when model_path has an up to date
+    tree export next to it, otherwise the unpickled model
+    '''
+    return load_model_with_digest(model_path)[0]
+
+def load_model_with_digest(model_path):
+    '''
+    (model, sha256 of the model.pkl content the model comes from)
+    '''
+    export_dir = tree_export_dir(model_path)
+    manifest_path = os.path.join(export_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        digest = file_digest(model_path)
+        key = (os.path.abspath(export_dir), digest)
+        predictor = _loaded.get(key)
+        if predictor is not None:
+            return predictor, digest
+
+        try:
+            predictor = TreePredictor.load(export_dir)
+        except (OSError, ValueError, KeyError):
+            predictor = None     # export being replaced or damaged, the pickle is always valid
+        if predictor is not None and predictor.manifest.get('model_digest') == digest:
+            with _loaded_lock:
+                for stale in [k for k in _loaded if k[0] == key[0]]:
+                    del _loaded[stale]
+                _loaded[key] = predictor
+            return predictor, digest
+
+    return artifact_cache.get_with_digest(model_path)
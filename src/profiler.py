@@ -0,0 +1,169 @@
+import contextvars
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.execution_budget import process_tree_cpu_seconds
+
+_current_profiler = contextvars.ContextVar('current_profiler', default=None)
+
+
+def _peak_rss_mb():
+    # VmHWM (linux) and ru_maxrss are the peak resident size of the process so far; they are
+    # never reset (clear_refs would also wipe the soft dirty bits other tools rely on)
+    try:
+        with open('/proc/self/status') as file_obj:
+            for line in file_obj:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource     # unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+
+class StageProfiler:
+    '''
+    Records wall time, cpu time (this process and all its descendants), peak RSS and row
+    counts per pipeline stage and writes them as a json report. peak_rss_mb is the process
+    peak at the end of the stage, peak_rss_growth_mb how much the stage raised it: 0 for a
+    stage that stayed under an earlier peak. Stages opened while the profiler is active (see activate and
+    profile_stage) are recorded from anywhere in the pipeline without passing it around.
+    '''
+    def __init__(self, run_name='training'):
+        self.run_name = run_name
+        self.started_at = datetime.now()
+        self.stages = []
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, rows=None, **extra):
+        '''
+        times the block; the yielded dict can be updated inside it, eg. stage['rows'] = len(df)
+        '''
+        record = {'stage': name, 'rows': rows, **extra}
+        self._depth += 1
+        wall, cpu, peak = time.perf_counter(), process_tree_cpu_seconds(), _peak_rss_mb()
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(process_tree_cpu_seconds() - cpu, 6)
+            end_peak = _peak_rss_mb()
+            record['peak_rss_mb'] = None if end_peak is None else round(end_peak, 3)
+            record['peak_rss_growth_mb'] = None if end_peak is None else round(max(0.0, end_peak - peak), 3)
+            self.stages.append(record)
+
+    def add(self, name, wall_s, cpu_s=None, rows=None, **extra):
+        '''
+        records a stage measured elsewhere, eg. inside a search worker process
+        '''
+        self.stages.append({'stage': name, 'rows': rows, 'wall_s': round(wall_s, 6),
+                            'cpu_s': None if cpu_s is None else round(cpu_s, 6), 'peak_rss_mb': None,
+                            'peak_rss_growth_mb': None, **extra})
+
+    @contextmanager
+    def activate(self):
+        token = _current_profiler.set(self)
+        try:
+            yield self
+        finally:
+            _current_profiler.reset(token)
+
+    def report(self):
+        return {
+            'run': self.run_name,
+            'started_at': self.started_at.isoformat(),
+            'total_wall_s': round(sum(s['wall_s'] for s in self.stages if not s.get('nested')), 6),
+            'stages': self.stages
+        }
+
+    def save(self, report_dir=os.path.join('artifact', 'profiles')):
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"{self.run_name}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as file_obj:
+            json.dump(self.report(), file_obj, indent=2, default=str)
+        return path
+
+    def summary_table(self):
+        return format_table(self.report())
+
+
+def current_profiler():
+    return _current_profiler.get()
+
+
+@contextmanager
+def profile_stage(name, rows=None, **extra):
+    '''
+    stage of the active profiler, or a no-op when nothing is being profiled
+    '''
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield {'stage': name, 'rows': rows, **extra}
+        return
+    with profiler.stage(name, rows=rows, **extra) as record:
+        yield record
+
+
+def format_table(report):
+    lines = [f"{'stage':<36}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}{'+MB':>8}{'rows':>10}"]
+    for s in report['stages']:
+        growth = s.get('peak_rss_growth_mb')
+        lines.append(
+            f"{s['stage']:<36}{s['wall_s']:>10.3f}"
+            f"{'' if s['cpu_s'] is None else format(s['cpu_s'], '.3f'):>10}"
+            f"{'' if s['peak_rss_mb'] is None else format(s['peak_rss_mb'], '.1f'):>10}"
+            f"{'' if growth is None else format(growth, '.1f'):>8}"
+            f"{'' if s['rows'] is None else s['rows']:>10}"
+        )
+    lines.append(f"{'total':<36}{report['total_wall_s']:>10.3f}")
+    return '\n'.join(lines)
+
+
+def diff_reports(old, new):
+    '''
+    per stage wall time change between two reports (dicts or json paths)
+    '''
+    old, new = (_load(r) for r in (old, new))
+    old_stages = {s['stage']: s for s in old['stages']}
+    new_stages = {s['stage']: s for s in new['stages']}
+
+    lines = [f"{'stage':<36}{'old s':>10}{'new s':>10}{'change':>10}"]
+    for name in list(old_stages) + [n for n in new_stages if n not in old_stages]:
+        a, b = old_stages.get(name), new_stages.get(name)
+        a_wall = None if a is None else a['wall_s']
+        b_wall = None if b is None else b['wall_s']
+        change = '' if not a_wall or b_wall is None else f'{(b_wall - a_wall) / a_wall:+.1%}'
+        lines.append(f"{name:<36}{'' if a_wall is None else format(a_wall, '.3f'):>10}"
+                     f"{'' if b_wall is None else format(b_wall, '.3f'):>10}{change:>10}")
+    return '\n'.join(lines)
+
+
+def _load(report):
+    if isinstance(report, dict):
+        return report
+    with open(report) as file_obj:
+        return json.load(file_obj)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Show or compare training profile reports')
+    parser.add_argument('reports', nargs='+', help='one report to show, or two to compare')
+    args = parser.parse_args()
+
+    if len(args.reports) == 1:
+        print(format_table(_load(args.reports[0])))
+    else:
+        print(diff_reports(args.reports[0], args.reports[1]))
@@ -0,0 +1,142 @@
+import time
+
+import numpy as np
+
+# how each ensemble is scored at every size of the n_estimators/iterations grid:
+# 'grow' models are trained level by level, each level adding trees to the previous fit,
+# 'staged' models are trained once at the largest size and scored through staged_predict
+STAGED_MODELS = {
+    'GradientBoostingRegressor': 'grow',
+    'RandomForestRegressor': 'grow',
+    'XGBRegressor': 'grow',
+    'CatBoostRegressor': 'grow',
+    'AdaBoostRegressor': 'staged'
+}
+
+def supports_staged_search(model, para, resource):
+    return type(model).__name__ in STAGED_MODELS and resource is not None and resource in para
+
+
+class StagedSearchCV:
+    '''
+    Grid search over every parameter except the ensemble size (n_estimators/iterations).
+    Smaller ensembles are prefixes of larger ones, so per candidate and fold the ensemble is
+    grown once through the size levels and scored (r2 on the validation fold) at each of them,
+    instead of training every size from scratch. A candidate stops growing once its mean
+    validation score has not improved for `patience` levels.
+    Exposes the part of the GridSearchCV interface the trainer uses: best_estimator_,
+    best_params_, best_score_, cv_results_, n_splits_ and refit_time_.
+    '''
+    def __init__(self, estimator, param_grid, resource, cv=5, n_jobs=1, patience=2):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.resource = resource
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.patience = patience
+
+    def fit(self, X, y):
+        from joblib import Parallel, delayed
+        from sklearn.model_selection import KFold, ParameterGrid
+
+        sizes = sorted(int(size) for size in self.param_grid[self.resource])
+        grid = {k: v for k, v in self.param_grid.items() if k != self.resource}
+        folds = list(KFold(n_splits=self.cv).split(X))
+        candidates = list(ParameterGrid(grid))
+
+        paths = Parallel(n_jobs=self.n_jobs)(
+            delayed(_score_candidate)(self.estimator, params, self.resource, sizes, folds, X, y, self.patience)
+            for params in candidates
+        )
+
+        results = {'params': [], 'mean_test_score': [], 'std_test_score': []}
+        self.n_fits_ = 0
+        for params, (scores, n_fits) in zip(candidates, paths):
+            self.n_fits_ += n_fits
+            for size, fold_scores in scores:
+                results['params'].append({**params, self.resource: size})
+                results['mean_test_score'].append(float(np.mean(fold_scores)))
+                results['std_test_score'].append(float(np.std(fold_scores)))
+
+        self.cv_results_ = {key: np.asarray(value) if key != 'params' else value for key, value in results.items()}
+        self.n_splits_ = self.cv
+        self.best_index_ = int(np.argmax(self.cv_results_['mean_test_score']))
+        self.best_params_ = self.cv_results_['params'][self.best_index_]
+        self.best_score_ = float(self.cv_results_['mean_test_score'][self.best_index_])
+
+        start = time.perf_counter()
+        self.best_estimator_ = _clone(self.estimator, self.best_params_).fit(X, y)
+        self.refit_time_ = time.perf_counter() - start
+
+        return self
+
+
+def _clone(estimator, params):
+    from sklearn.base import clone
+    return clone(estimator).set_params(**params)
+
+def _score_candidate(estimator, params, resource, sizes, folds, X, y, patience):
+    '''
+    [(size, per fold r2), ...] for the sizes reached before early stopping, and the number of fit calls
+    '''
+    from sklearn.metrics import r2_score
+
+    kind = STAGED_MODELS[type(estimator).__name__]
+    scores, n_fits = [], 0
+
+    if kind == 'staged':
+        # one fit at the largest size, staged_predict yields the prediction after every boosting round
+        per_fold = []
+        for train_idx, val_idx in folds:
+            model = _clone(estimator, {**params, resource: sizes[-1]}).fit(X[train_idx], y[train_idx])
+            n_fits += 1
+            stages = [r2_score(y[val_idx], pred) for pred in model.staged_predict(X[val_idx])]
+            # adaboost can stop before n_estimators, larger sizes then score like its last round
+            per_fold.append([stages[min(size, len(stages)) - 1] for size in sizes])
+        per_fold = np.asarray(per_fold)
+        best, since_best = -np.inf, 0
+        for level, size in enumerate(sizes):
+            scores.append((size, per_fold[:, level].tolist()))
+            mean = per_fold[:, level].mean()
+            best, since_best = (mean, 0) if mean > best else (best, since_best + 1)
+            if since_best >= patience:
+                break
+        return scores, n_fits
+
+    models = [None] * len(folds)
+    best, since_best, previous_size = -np.inf, 0, 0
+    for size in sizes:
+        fold_scores = []
+        for i, (train_idx, val_idx) in enumerate(folds):
+            models[i] = _grow(estimator, params, resource, models[i], previous_size, size, X[train_idx], y[train_idx])
+            n_fits += 1
+            fold_scores.append(r2_score(y[val_idx], models[i].predict(X[val_idx])))
+        scores.append((size, fold_scores))
+        previous_size = size
+
+        mean = np.mean(fold_scores)
+        best, since_best = (mean, 0) if mean > best else (best, since_best + 1)
+        if since_best >= patience:
+            break
+
+    return scores, n_fits
+
+def _grow(estimator, params, resource, model, previous_size, size, X, y):
+    '''
+    extends model (trained to previous_size, or None) to size trees
+    '''
+    name = type(estimator).__name__
+
+    if name in ('GradientBoostingRegressor', 'RandomForestRegressor'):
+        # warm_start keeps the fitted trees and only adds the missing ones
+        if model is None:
+            model = _clone(estimator, {**params, 'warm_start': True})
+        return model.set_params(**{resource: size}).fit(X, y)
+
+    # xgboost and catboost continue boosting from an existing model
+    increment = _clone(estimator, {**params, resource: size - previous_size})
+    if model is None:
+        return increment.fit(X, y)
+    if name == 'XGBRegressor':
+        return increment.fit(X, y, xgb_model=model.get_booster())
+    return increment.fit(X, y, init_model=model)
@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pandas as pd
+
+from src.exception import CustomeException
+
+# extension used for each supported artifact format
+ARTIFACT_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'csv': '.csv'
+}
+
+CATEGORICAL_COLUMNS = [
+    'gender',
+    'race_ethnicity',
+    'parental_level_of_education',
+    'lunch',
+    'test_preparation_course'
+]
+SCORE_COLUMNS = ['math_score', 'reading_score', 'writing_score']
+
+
+def artifact_file(directory, name, artifact_format):
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f'Unknown artifact format {artifact_format!r}, expected one of {list(ARTIFACT_FORMATS)}')
+    return os.path.join(directory, name + ARTIFACT_FORMATS[artifact_format])
+
+
+def format_of(path):
+    for artifact_format, extension in ARTIFACT_FORMATS.items():
+        if path.endswith(extension):
+            return artifact_format
+    raise ValueError(f'Cannot tell the artifact format of {path!r}')
+
+
+def apply_stud_dtypes(df):
+    '''
+    explicit dtypes for the stud columns: categoricals for the five string features and
+    int16 for the scores (float32 when a score column has missing values)
+    '''
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in SCORE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('float32' if df[column].isna().any() else 'int16')
+    return df
+
+
+def write_frame(df, path):
+    '''
+    writes df to path in the format given by its extension (.parquet, .arrow or .csv)
+    '''
+    try:
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        artifact_format = format_of(path)
+        if artifact_format == 'csv':
+            df.to_csv(path, index=False, header=True)
+            return
+
+        df = apply_stud_dtypes(df).reset_index(drop=True)
+        if artifact_format == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            # uncompressed arrow ipc so the reader can memory map the buffers
+            df.to_feather(path, compression='uncompressed')
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+
+def read_frame(path):
+    '''
+    reads a .parquet/.arrow/.csv file, or a directory of such part files, with stud dtypes applied.
+    a directory without parts (eg. an incremental store nothing was written to yet) gives an empty
+    frame with the stud columns
+    '''
+    try:
+        if os.path.isdir(path):
+            parts = sorted(f for f in os.listdir(path) if not f.startswith('.'))
+            if not parts:
+                df = pd.DataFrame({column: pd.Series(dtype=object) for column in CATEGORICAL_COLUMNS + SCORE_COLUMNS})
+            else:
+                df = pd.concat([_read_file(os.path.join(path, f)) for f in parts], ignore_index=True)
+        else:
+            df = _read_file(path)
+
+        return apply_stud_dtypes(df)
+
+    except Exception as e:
+        raise CustomeException(e, sys)
+
+
+def _read_file(path):
+    artifact_format = format_of(path)
+    if artifact_format == 'parquet':
+        return pd.read_parquet(path)
+    if artifact_format == 'arrow':
+        import pyarrow.feather as feather
+
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_csv(path)
@@ -1,19 +1,22 @@
 import os
 import sys
+import hashlib
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
-import pandas as pd
 import numpy as np
 
-import dill
-import pickle
-
 from src.exception import CustomeException
+from src.logger import logging
+from src.profiler import current_profiler
+from src.execution_budget import (ExecutionBudget, configure_estimator, limit_worker_threads, process_tree_cpu_seconds,
+                                  reset_estimator_threads)
 
-from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV
-
-import streamlit as st
-
+# the artifact loaders live in src.artifact_cache so that serving does not import the training stack;
+# they are re-exported here for existing callers
+from src.artifact_cache import ArtifactCache, artifact_cache, load_cached_object, load_object  # noqa: F401
 
 
 def save_object(file_path, obj):
@@ -21,44 +24,316 @@ def save_object(file_path, obj):
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
 
-        with open(file_path, 'wb') as file_obj:
-            dill.dump(obj, file_obj)
+        # write to a temp file in the same directory and rename it over the target,
+        # so readers only ever see the old or the new file, never a half written one
+        import dill
+
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path or '.', prefix='.tmp_', suffix='.pkl')
+        try:
+            with os.fdopen(fd, 'wb') as file_obj:
+                dill.dump(obj, file_obj)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        artifact_cache.invalidate(file_path)
 
     except Exception as e:
         raise CustomeException(e, sys)
-    
-def evaluate_model(X_train, y_train, X_test, y_test, models:dict, param):
+
+SEARCH_STRATEGIES = ('grid', 'halving', 'random', 'staged')
+
+# parameters that size an ensemble; budgeted searches grow them as the resource instead of searching them
+RESOURCE_PARAMS = ('n_estimators', 'iterations')
+
+def evaluate_model(X_train, y_train, X_test, y_test, models:dict, param, n_jobs=1, checkpoint_dir=None,
+                   search_strategy='grid', max_fits=None, time_budget=None, details=None, progress=None,
+                   patience=2, budget=None):
+    '''
+    runs a hyperparameter search per model and returns {model name: test r2}.
+    the searches run concurrently in a process pool sharing a budget of n_jobs cores (-1 = all cores),
+    split by an ExecutionBudget (pass one in to read back its plan and measured utilization).
+    the search's best_estimator_ (already refit on the full train set) replaces the entry in models,
+    and when checkpoint_dir is given every finished model is checkpointed so an interrupted run resumes.
+
+    search_strategy is one of 'grid' (exhaustive), 'halving' (successive halving growing
+    n_estimators/iterations), 'random' or 'staged' (the full grid, but every ensemble size of a
+    candidate is scored from one growing fit that stops after `patience` levels without improvement).
+    for 'halving' and 'random' max_fits and time_budget (seconds, turned into fits with a probe fit)
+    bound the total number of cross validation fits of each model's search (the final refit aside);
+    'grid' and 'staged' ignore them.
+    if a details dict is passed it is filled with {model name: best params, scores and fit count}.
+    progress(model name, finished, total) is called after every model, and with a None name about
+    every second while pool searches run; an exception raised by it (eg. a cancellation) stops
+    the remaining searches and terminates the running ones
+    '''
     try:
+        if search_strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f'Unknown search strategy {search_strategy!r}, expected one of {SEARCH_STRATEGIES}')
+
         report = {}
-        for i in range(len(models)):
-            model = list(models.values())[i]        #pull the model from models dict. eg LinearRegression()
-            para = param[list(models.keys())[i]]       # pull the paramets from params dict for hyperparameter tuning
-            
-            gs = GridSearchCV(model, para, cv = 5)
-            gs.fit(X_train, y_train)
+        details = {} if details is None else details
+        search = {'strategy': search_strategy, 'max_fits': max_fits, 'time_budget': time_budget, 'patience': patience}
+        budget = budget or ExecutionBudget(n_jobs)
+        data_key = data_fingerprint(X_train, y_train, X_test, y_test)
 
-            model.set_params(**gs.best_params_)
-            model.fit(X_train, y_train)
+        pending = []
+        for name, model in models.items():
+            para = param[name]      # pull the paramets from params dict for hyperparameter tuning
+            checkpoint_path = _checkpoint_path(checkpoint_dir, name, model, para, data_key, search)
 
-            y_train_pred = model.predict(X_train)
-            y_test_pred = model.predict(X_test)
+            result = _load_checkpoint(checkpoint_path)
+            if result is not None:
+                logging.info(f'Resumed {name} from checkpoint {checkpoint_path}')
+                _finish_search(result, models, report, details, None, resumed=True)
+                if progress is not None:
+                    progress(name, len(report), len(models))
+            else:
+                pending.append((name, model, para, checkpoint_path))
 
-            train_score = r2_score(y_train, y_train_pred)
-            test_score = r2_score(y_test, y_test_pred)
+        workers, inner_jobs = budget.plan_searches(len(pending))
+        if workers <= 1:
+            for name, model, para, checkpoint_path in pending:
+                result = _search_model(name, model, para, X_train, y_train, X_test, y_test, inner_jobs, search)
+                _finish_search(result, models, report, details, checkpoint_path)
+                if progress is not None:
+                    progress(name, len(report), len(models))
+        else:
+            # each concurrent search gets its share of the cores for its fits, and the BLAS/OpenMP
+            # pools of its process are capped to that share
+            context = multiprocessing.get_context('spawn')
+            children_before = set(multiprocessing.active_children())
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                           initializer=limit_worker_threads, initargs=(inner_jobs,))
+            pool_processes = []
+            try:
+                # memory mapped inputs travel as file references, every worker maps the same pages
+                shared = [_share_array(arr) for arr in (X_train, y_train, X_test, y_test)]
+                futures = {
+                    executor.submit(_search_model, name, model, para, *shared, inner_jobs, search): checkpoint_path
+                    for name, model, para, checkpoint_path in pending
+                }
+                # the pool starts its workers on submit: they are the child processes that appeared since
+                pool_processes = [p for p in multiprocessing.active_children() if p not in children_before]
+                running = set(futures)
+                while running:
+                    finished, running = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        _finish_search(result, models, report, details, futures[future])
+                        if progress is not None:
+                            progress(result['name'], len(report), len(models))
+                    if not finished and progress is not None:
+                        progress(None, len(report), len(models))
+            except BaseException:
+                # do not start the searches still queued and stop the running ones, finished ones
+                # are already checkpointed
+                executor.shutdown(wait=False, cancel_futures=True)
+                for process in pool_processes:
+                    if process.is_alive():
+                        process.terminate()
+                raise
+            executor.shutdown()
 
-            report[list(models.keys())[i]] = test_score      # add the name of the model as key and test score as value in report dict
+        # keep the report in the same order as the models dict
+        return {name: report[name] for name in models}
 
-        return report
-    
     except Exception as e:
         raise CustomeException(e, sys)
-    
-def load_object(file_path):
-    try:
-        with open(file_path, "rb") as file_obj:
-            return pickle.load(file_obj)
 
-    except Exception as e:
-        raise CustomeException(e, sys)
-    
+def build_search(model, para, strategy='grid', n_jobs=1, max_fits=None, cv=5, patience=2):
+    '''
+    returns an unfitted search object for the strategy.
+    'halving' treats n_estimators/iterations as the resource that grows between rounds and starts
+    with as many candidates as keep all its rounds within max_fits fits,
+    'random' samples at most max_fits // cv candidates from the grid,
+    'staged' scores every n_estimators/iterations value of a candidate from one growing ensemble
+    (models without staged support fall back to the grid)
+    '''
+    from sklearn.model_selection import GridSearchCV, RandomizedSearchCV, ParameterGrid
+
+    n_candidates = len(ParameterGrid(para))
+
+    if strategy == 'staged':
+        from src.staged_search import StagedSearchCV, supports_staged_search
+
+        resource = next((p for p in RESOURCE_PARAMS if p in para), None)
+        if supports_staged_search(model, para, resource):
+            return StagedSearchCV(model, para, resource, cv = cv, n_jobs = n_jobs, patience = patience)
+        strategy = 'grid'
+
+    if strategy == 'grid' or n_candidates <= 1:
+        return GridSearchCV(model, para, cv = cv, n_jobs = n_jobs)
+
+    if strategy == 'random':
+        n_iter = n_candidates if max_fits is None else min(n_candidates, max(1, max_fits // cv))
+        return RandomizedSearchCV(model, para, n_iter = n_iter, cv = cv, n_jobs = n_jobs, random_state = 42)
+
+    # successive halving
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables the halving searches)
+    from sklearn.model_selection import HalvingGridSearchCV, HalvingRandomSearchCV
+
+    # the resource must be a constructor parameter the estimator reports (catboost only reports
+    # the ones it was built with), otherwise the rounds grow the number of samples instead
+    resource = next((p for p in RESOURCE_PARAMS if p in para and p in model.get_params()), None)
+    if resource is None:
+        resource, grid = 'n_samples', para
+        max_resources = 'auto'
+    else:
+        grid = {k: v for k, v in para.items() if k != resource}
+        max_resources = int(max(para[resource]))
+
+    budget_candidates = None if max_fits is None else _halving_candidates(max_fits, cv)
+    if budget_candidates is not None and budget_candidates < len(ParameterGrid(grid)):
+        return HalvingRandomSearchCV(model, grid, n_candidates = budget_candidates, resource = resource,
+                                     max_resources = max_resources, min_resources = 'exhaust',
+                                     cv = cv, n_jobs = n_jobs, random_state = 42)
+
+    return HalvingGridSearchCV(model, grid, resource = resource, max_resources = max_resources,
+                               min_resources = 'exhaust', cv = cv, n_jobs = n_jobs, random_state = 42)
+
+def _halving_fits(n_candidates, cv, factor=3):
+    # upper bound of the fits of a successive halving search: every round keeps 1/factor of
+    # the candidates until one is left (with few resource levels it stops earlier)
+    fits = n_candidates * cv
+    while n_candidates > 1:
+        n_candidates = -(-n_candidates // factor)
+        fits += n_candidates * cv
+    return fits
+
+def _halving_candidates(max_fits, cv, factor=3):
+    '''
+    the most starting candidates whose halving rounds stay within max_fits fits (at least 1)
+    '''
+    n_candidates = 1
+    while _halving_fits(n_candidates + 1, cv, factor) <= max_fits:
+        n_candidates += 1
+    return n_candidates
+
+def _search_model(name, model, para, X_train, y_train, X_test, y_test, n_jobs, search):
+    from sklearn.base import clone
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import ParameterGrid
+
+    # n_jobs cores: parallel fits first, any cores left over become threads of each fit
+    # (XGBoost/CatBoost would otherwise start one thread per host core in every fit)
+    search_jobs, threads = ExecutionBudget.split(n_jobs, len(ParameterGrid(para)) * 5)
+    model = clone(model)
+    configure_estimator(model, threads)
+
+    X_train, y_train, X_test, y_test = (_resolve_array(arr) for arr in (X_train, y_train, X_test, y_test))
+    max_fits = search['max_fits']
+
+    if search['time_budget'] is not None and search['strategy'] in ('halving', 'random'):
+        # turn the wall clock budget into a fit budget using the cost of one probe fit
+        start = time.perf_counter()
+        clone(model).fit(X_train, y_train)
+        fit_seconds = max(time.perf_counter() - start, 1e-3)
+        time_fits = max(1, int(search['time_budget'] * search_jobs / fit_seconds))
+        max_fits = time_fits if max_fits is None else min(max_fits, time_fits)
+
+    gs = build_search(model, para, strategy = search['strategy'], n_jobs = search_jobs, max_fits = max_fits,
+                      patience = search.get('patience', 2))
+    # cpu of this process and its descendants: with search_jobs > 1 the fits run in joblib workers
+    start, cpu_start = time.perf_counter(), process_tree_cpu_seconds()
+    gs.fit(X_train, y_train)
+    search_seconds, search_cpu_seconds = time.perf_counter() - start, process_tree_cpu_seconds() - cpu_start
+
+    # refit=True already fitted the best configuration on the whole train set
+    best_model = gs.best_estimator_
+
+    y_train_pred = best_model.predict(X_train)
+    y_test_pred = best_model.predict(X_test)
+    # the search's thread count must not end up in model.pkl and at serving time
+    reset_estimator_threads(best_model)
+
+    return {
+        'name': name,
+        'estimator': best_model,
+        'best_params': gs.best_params_,
+        # a staged search scores several sizes per fit, so it counts its fits itself
+        'n_fits': getattr(gs, 'n_fits_', len(gs.cv_results_['params']) * gs.n_splits_),
+        'search_seconds': search_seconds,
+        'search_cpu_seconds': search_cpu_seconds,
+        'refit_seconds': getattr(gs, 'refit_time_', None),
+        'train_score': r2_score(y_train, y_train_pred),
+        'test_score': r2_score(y_test, y_test_pred)
+    }
+
+class _MappedArrayRef:
+    def __init__(self, path):
+        self.path = path
+
+def _share_array(arr):
+    '''
+    replaces a memory map of a whole .npy file by a reference to the file, so it is not pickled into the worker
+    '''
+    if isinstance(arr, np.memmap) and arr.filename is not None and str(arr.filename).endswith('.npy'):
+        mapped = np.load(arr.filename, mmap_mode='r')
+        if mapped.shape == arr.shape and mapped.dtype == arr.dtype:
+            return _MappedArrayRef(arr.filename)
+    return arr
+
+def _resolve_array(arr):
+    if isinstance(arr, _MappedArrayRef):
+        return np.load(arr.path, mmap_mode='r')
+    return arr
+
+def _finish_search(result, models, report, details, checkpoint_path, resumed=False):
+    name = result['name']
+    models[name] = result['estimator']
+    report[name] = result['test_score']     # add the name of the model as key and test score as value in report dict
+    details[name] = {k: v for k, v in result.items() if k not in ('name', 'estimator')}
+
+    profiler = current_profiler()
+    if profiler is not None and not resumed:
+        # searches run in parallel worker processes, so these overlap inside the model_search stage
+        profiler.add(f'search:{name}', result['search_seconds'], result['search_cpu_seconds'],
+                     n_fits=result['n_fits'], nested=True)
+        if result.get('refit_seconds') is not None:
+            profiler.add(f'refit:{name}', result['refit_seconds'], nested=True)
+    logging.info(f"{name} search finished with {result['n_fits']} fits, test r2 {result['test_score']:.4f}")
+
+    if checkpoint_path is not None:
+        save_object(checkpoint_path, result)
+
+def data_fingerprint(*arrays):
+    digest = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        digest.update(str(arr.shape).encode())
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+def _checkpoint_path(checkpoint_dir, name, model, para, data_key, search):
+    if checkpoint_dir is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update(data_key.encode())
+    digest.update(repr(sorted(model.get_params().items())).encode())
+    digest.update(repr(sorted(para.items())).encode())
+    digest.update(repr(sorted(search.items())).encode())
+
+    slug = ''.join(c if c.isalnum() else '_' for c in name)
+    return os.path.join(checkpoint_dir, f'{slug}-{digest.hexdigest()[:16]}.pkl')
+
+def _load_checkpoint(checkpoint_path):
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return None
+    try:
+        return load_object(checkpoint_path)
+    except CustomeException:
+        # a corrupt checkpoint only costs a re-run of that search
+        logging.info(f'Ignoring unreadable checkpoint {checkpoint_path}')
+        return None
 
+def clear_checkpoints(checkpoint_dir):
+    if checkpoint_dir is None or not os.path.isdir(checkpoint_dir):
+        return
+    for file_name in os.listdir(checkpoint_dir):
+        if file_name.endswith('.pkl'):
+            os.remove(os.path.join(checkpoint_dir, file_name))
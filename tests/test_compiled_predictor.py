@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+pd = pytest.importorskip('pandas')
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+from src.components.data_transformation import DataTransformation
+from src.pipelines.compiled_predictor import CompiledPredictor
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS
+
+STUD_CSV = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'data', 'stud.csv')
+
+
+@pytest.fixture(scope='module')
+def stud():
+    return pd.read_csv(STUD_CSV)
+
+@pytest.fixture(scope='module')
+def preprocessor(stud):
+    return DataTransformation().get_data_transformer_object().fit(stud[FEATURE_COLUMNS])
+
+@pytest.fixture(scope='module')
+def linear(stud, preprocessor):
+    return LinearRegression().fit(preprocessor.transform(stud[FEATURE_COLUMNS]), stud['math_score'])
+
+def dense(X):
+    return X.toarray() if hasattr(X, 'toarray') else np.asarray(X)
+
+def with_missing_values(df):
+    df = df.copy()
+    df.loc[df.index[::7], 'reading_score'] = np.nan
+    df.loc[df.index[::11], 'lunch'] = np.nan
+    return df
+
+
+def test_transform_matches_column_transformer(stud, preprocessor, linear):
+    predictor = CompiledPredictor.from_objects(preprocessor, linear)
+    np.testing.assert_array_equal(predictor.transform(stud), dense(preprocessor.transform(stud[FEATURE_COLUMNS])))
+
+def test_missing_values_are_imputed_like_sklearn(stud, preprocessor, linear):
+    df = with_missing_values(stud)
+    predictor = CompiledPredictor.from_objects(preprocessor, linear)
+    np.testing.assert_array_equal(predictor.transform(df), dense(preprocessor.transform(df[FEATURE_COLUMNS])))
+
+def test_linear_predictions_match(stud, preprocessor, linear):
+    X = preprocessor.transform(stud[FEATURE_COLUMNS])
+    predictor = CompiledPredictor.from_objects(preprocessor, linear)
+
+    np.testing.assert_array_equal(predictor.predict(stud), linear.predict(X))
+    row = stud[FEATURE_COLUMNS].iloc[3].to_dict()
+    assert predictor.predict_row(row) == linear.predict(X[3:4])[0]
+
+def test_other_models_get_the_encoded_matrix(stud, preprocessor):
+    X = preprocessor.transform(stud[FEATURE_COLUMNS])
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, stud['math_score'])
+    predictor = CompiledPredictor.from_objects(preprocessor, model)
+    np.testing.assert_array_equal(predictor.predict(stud), model.predict(X))
+
+def test_unknown_category_is_rejected(stud, preprocessor, linear):
+    predictor = CompiledPredictor.from_objects(preprocessor, linear)
+    row = dict(stud[FEATURE_COLUMNS].iloc[0], gender='unknown')
+    with pytest.raises(Exception):
+        predictor.transform_row(row)
+
+def test_none_category_is_not_a_missing_value(stud, preprocessor, linear):
+    # SimpleImputer only imputes NaN: None reaches the encoder as an unknown category
+    df = stud[FEATURE_COLUMNS].iloc[:3].astype(object)
+    df.iloc[0, df.columns.get_loc('lunch')] = None
+    predictor = CompiledPredictor.from_objects(preprocessor, linear)
+
+    with pytest.raises(ValueError):
+        preprocessor.transform(df)
+    with pytest.raises(Exception):
+        predictor.transform(df)
+
+def test_compiled_predictor_is_keyed_on_the_loaded_bytes(tmp_path, stud, preprocessor, linear):
+    from src.utils import save_object
+    from src.artifact_cache import file_digest
+    from src.pipelines.compiled_predictor import _compiled, get_compiled_predictor
+
+    model_path, preprocessor_path = str(tmp_path / 'model.pkl'), str(tmp_path / 'preprocessor.pkl')
+    save_object(model_path, linear)
+    save_object(preprocessor_path, preprocessor)
+
+    predictor = get_compiled_predictor(model_path, preprocessor_path)
+    assert _compiled == {(file_digest(model_path), file_digest(preprocessor_path)): predictor}
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('sqlalchemy')
+pytest.importorskip('pyarrow')
+
+from src.components.data_ingestion import DataIngestion
+from src.storage import read_frame
+
+STUD_CSV = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'data', 'stud.csv')
+
+
+@pytest.fixture
+def stud():
+    df = pd.read_csv(STUD_CSV)
+    df.insert(0, 'id', range(1, len(df) + 1))
+    return df
+
+def write_table(db_path, df):
+    with sqlite3.connect(db_path) as conn:
+        df.to_sql('stud', conn, if_exists='replace', index=False)
+
+def ingestion(db_path, store_dir):
+    obj = DataIngestion(conn_url=f'sqlite:///{db_path}')
+    config = obj.ingestion_config
+    config.watermark_column = 'id'
+    config.state_file_path = os.path.join(store_dir, 'ingestion_state.json')
+    config.store_train_dir = os.path.join(store_dir, 'train')
+    config.store_test_dir = os.path.join(store_dir, 'test')
+    return obj
+
+def store_ids(obj):
+    config = obj.ingestion_config
+    return (sorted(read_frame(config.store_train_dir)['id']), sorted(read_frame(config.store_test_dir)['id']))
+
+
+def test_two_pulls_equal_one_pull(tmp_path, stud):
+    db_path = str(tmp_path / 'stud.db')
+
+    write_table(db_path, stud.iloc[:600])
+    twice = ingestion(db_path, str(tmp_path / 'twice'))
+    twice.initiate_incremental_ingestion()
+    write_table(db_path, stud)
+    twice.initiate_incremental_ingestion()
+    assert twice.read_watermark() == len(stud)
+
+    once = ingestion(db_path, str(tmp_path / 'once'))
+    once.initiate_incremental_ingestion()
+
+    train_ids, test_ids = store_ids(twice)
+    assert (train_ids, test_ids) == store_ids(once)
+    assert sorted(train_ids + test_ids) == list(stud['id'])
+
+    is_test = DataIngestion.hash_split(stud['id'], twice.ingestion_config.test_percent)
+    assert test_ids == sorted(stud.loc[is_test, 'id'])
+    assert sorted(os.listdir(twice.ingestion_config.store_train_dir)) == ['part-after-600.parquet', 'part-after-start.parquet']
+
+def test_a_retried_pull_overwrites_its_parts(tmp_path, stud):
+    db_path = str(tmp_path / 'stud.db')
+    write_table(db_path, stud)
+    obj = ingestion(db_path, str(tmp_path / 'store'))
+
+    obj.initiate_incremental_ingestion()
+    # a crash after the parts were written but before the mark moved
+    os.remove(obj.ingestion_config.state_file_path)
+    obj.initiate_incremental_ingestion()
+
+    train_ids, test_ids = store_ids(obj)
+    assert sorted(train_ids + test_ids) == list(stud['id'])
+
+def test_a_missing_watermark_column_is_reported(tmp_path, stud):
+    db_path = str(tmp_path / 'stud.db')
+    write_table(db_path, stud.drop(columns='id'))
+    obj = ingestion(db_path, str(tmp_path / 'store'))
+
+    with pytest.raises(Exception, match="'id' is not a column of stud"):
+        obj.initiate_incremental_ingestion()
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+pd = pytest.importorskip('pandas')
+
+from sklearn.linear_model import LinearRegression
+
+from src.components.data_transformation import DataTransformation
+from src.components.incremental_linear import IncrementalLinearTrainer, LinearState
+from src.components.streaming_trainer import TARGET_COLUMN
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS
+
+STUD_CSV = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'data', 'stud.csv')
+
+
+@pytest.fixture(scope='module')
+def stud():
+    df = pd.read_csv(STUD_CSV)
+    df.loc[df.index[::9], 'writing_score'] = np.nan
+    df.loc[df.index[::13], 'parental_level_of_education'] = np.nan
+    # sorted so that some categories only show up in later chunks
+    return df.sort_values(['race_ethnicity', 'math_score'], kind='stable').reset_index(drop=True)
+
+def split(df, n_chunks):
+    bounds = np.linspace(0, len(df), n_chunks + 1).astype(int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def folded_trainer(chunks):
+    columns = {name: columns for name, _, columns in DataTransformation().get_data_transformer_object().transformers}
+    trainer = IncrementalLinearTrainer()
+    trainer.state = LinearState(columns['num_pipeline'], columns['cat_pipeline'])
+    for chunk in chunks:
+        trainer.state.update(chunk)
+    return trainer
+
+
+@pytest.mark.parametrize('n_chunks', [1, 4])
+def test_refresh_equals_full_refit(stud, n_chunks):
+    preprocessor, model = folded_trainer(split(stud, n_chunks)).fit()
+
+    full_preprocessor = DataTransformation().get_data_transformer_object().fit(stud[FEATURE_COLUMNS])
+    X = full_preprocessor.transform(stud[FEATURE_COLUMNS])
+    full_model = LinearRegression().fit(X, stud[TARGET_COLUMN])
+
+    np.testing.assert_allclose(preprocessor.transform(stud[FEATURE_COLUMNS]), X, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(model.predict(X), full_model.predict(X), rtol=1e-9, atol=1e-8)
+    np.testing.assert_allclose(model.coef_, full_model.coef_, rtol=1e-6, atol=1e-8)
+
+def test_fold_order_does_not_matter(stud):
+    chunks = split(stud, 5)
+    _, forward = folded_trainer(chunks).fit()
+    _, backward = folded_trainer(chunks[::-1]).fit()
+
+    X = DataTransformation().get_data_transformer_object().fit_transform(stud[FEATURE_COLUMNS])
+    np.testing.assert_allclose(forward.predict(X), backward.predict(X), rtol=1e-9, atol=1e-8)
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import time
+
+from src.logger import JsonFormatter, SizeTimeRotatingFileHandler, _level
+
+
+def record(message, **extra):
+    entry = logging.LogRecord('src.test', logging.INFO, __file__, 1, message, None, None)
+    entry.__dict__.update(extra)
+    return entry
+
+def handler(path, max_bytes=0, backup_count=100, interval_s=0):
+    file_handler = SizeTimeRotatingFileHandler(str(path), max_bytes=max_bytes, backup_count=backup_count, interval_s=interval_s)
+    file_handler.setFormatter(JsonFormatter())
+    return file_handler
+
+def read_lines(directory):
+    lines = []
+    for file_name in os.listdir(directory):
+        if file_name.startswith('app.log') and not file_name.endswith('.lock'):
+            with open(os.path.join(directory, file_name), encoding='utf-8') as file_obj:
+                lines += [json.loads(line) for line in file_obj]
+    return lines
+
+
+def test_records_are_json_lines_with_extra_fields(tmp_path):
+    file_handler = handler(tmp_path / 'app.log')
+    file_handler.handle(record('trained', r2=0.88, stage='model_search'))
+    file_handler.close()
+
+    [entry] = read_lines(tmp_path)
+    assert entry['message'] == 'trained'
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'src.test'
+    assert (entry['r2'], entry['stage']) == (0.88, 'model_search')
+
+def test_processes_sharing_the_file_rotate_without_losing_lines(tmp_path):
+    # one handler per process, all writing the same app.log
+    handlers = [handler(tmp_path / 'app.log', max_bytes=2000) for _ in range(3)]
+    for i in range(300):
+        handlers[i % 3].handle(record(f'line {i}'))
+    for file_handler in handlers:
+        file_handler.close()
+
+    files = sorted(os.listdir(tmp_path))
+    assert 'app.log.1' in files
+    assert max(os.path.getsize(tmp_path / f) for f in files if f.startswith('app.log')) < 2000 + 500
+    assert sorted(int(entry['message'].split()[1]) for entry in read_lines(tmp_path)) == list(range(300))
+
+def test_backups_are_capped(tmp_path):
+    file_handler = handler(tmp_path / 'app.log', max_bytes=500, backup_count=2)
+    for i in range(100):
+        file_handler.handle(record(f'line {i}'))
+    file_handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['app.log', 'app.log.1', 'app.log.2', 'app.log.lock']
+
+def test_the_file_rotates_once_per_interval(tmp_path):
+    file_handler = handler(tmp_path / 'app.log', interval_s=3600)
+    file_handler.handle(record('before'))
+    # the last rollover was two hours ago
+    past = time.time() - 7200
+    os.utime(file_handler.lock_path, (past, past))
+    file_handler.handle(record('after'))
+    file_handler.handle(record('same hour'))
+    file_handler.close()
+
+    with open(tmp_path / 'app.log.1', encoding='utf-8') as file_obj:
+        assert [json.loads(line)['message'] for line in file_obj] == ['before']
+    with open(tmp_path / 'app.log', encoding='utf-8') as file_obj:
+        assert [json.loads(line)['message'] for line in file_obj] == ['after', 'same hour']
+
+def test_unknown_levels_fall_back_to_the_default():
+    invalid = []
+    assert _level(' warning ', logging.INFO, invalid) == 'WARNING'
+    assert _level('15', logging.INFO, invalid) == 15
+    assert _level('LOUD', logging.INFO, invalid) == logging.INFO
+    assert invalid == ['LOUD']
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from src.components.model_registry import ModelRegistry
+from src.exception import CustomeException
+
+
+def write_artifacts(directory, content):
+    os.makedirs(directory, exist_ok=True)
+    model_path = os.path.join(directory, 'model.pkl')
+    preprocessor_path = os.path.join(directory, 'preprocessor.pkl')
+    with open(model_path, 'wb') as file_obj:
+        file_obj.write(b'model ' + content)
+    with open(preprocessor_path, 'wb') as file_obj:
+        file_obj.write(b'preprocessor ' + content)
+    return model_path, preprocessor_path
+
+def read(path):
+    with open(path, 'rb') as file_obj:
+        return file_obj.read()
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+def test_register_activates_and_stores_a_copy(registry, tmp_path):
+    model_path, preprocessor_path = write_artifacts(tmp_path / 'run1', b'one')
+
+    version = registry.register(model_path, preprocessor_path, metadata={'model_name': 'Linear Regression', 'r2': 0.88})
+
+    assert registry.active_version() == version
+    stored_model, stored_preprocessor = registry.artifact_paths()
+    assert read(stored_model) == b'model one'
+    assert read(stored_preprocessor) == b'preprocessor one'
+    entry = registry.metadata(version)
+    assert entry['model_name'] == 'Linear Regression'
+    assert entry['artifact_size'] == len(b'model one') + len(b'preprocessor one')
+
+    # the training run may overwrite its own artifacts, the registered copy stays as it was
+    write_artifacts(tmp_path / 'run1', b'two')
+    assert read(stored_model) == b'model one'
+
+def test_registering_the_same_content_is_a_no_op(registry, tmp_path):
+    first = registry.register(*write_artifacts(tmp_path / 'run1', b'one'))
+    again = registry.register(*write_artifacts(tmp_path / 'run2', b'one'))
+
+    assert again == first
+    assert [entry['version'] for entry in registry.list_versions()] == [first]
+    assert not [name for name in os.listdir(registry.registry_config.versions_dir) if name.startswith('.')]
+
+def test_activate_and_rollback_switch_the_pointer(registry, tmp_path):
+    first = registry.register(*write_artifacts(tmp_path / 'run1', b'one'))
+    second = registry.register(*write_artifacts(tmp_path / 'run2', b'two'))
+    third = registry.register(*write_artifacts(tmp_path / 'run3', b'three'), activate=False)
+
+    assert len({first, second, third}) == 3
+    assert [entry['version'] for entry in registry.list_versions()] == [first, second, third]
+    assert registry.active_version() == second
+
+    registry.activate(third)
+    assert registry.active_version() == third
+    assert read(registry.artifact_paths()[0]) == b'model three'
+
+    assert registry.rollback() == second
+    assert registry.active_version() == second
+    assert registry.rollback() == first
+    assert read(registry.artifact_paths()[0]) == b'model one'
+
+    with pytest.raises(CustomeException, match='No earlier model version'):
+        registry.rollback()
+    assert registry.active_version() == first
+
+def test_the_pointer_is_shared_between_registry_instances(registry, tmp_path):
+    first = registry.register(*write_artifacts(tmp_path / 'run1', b'one'))
+    serving = ModelRegistry(registry.registry_config.registry_dir)
+    assert serving.artifact_paths()[0] == registry.artifact_paths(first)[0]
+
+    second = registry.register(*write_artifacts(tmp_path / 'run2', b'two'))
+    assert serving.active_version() == second
+
+def test_unknown_versions_are_rejected(registry, tmp_path):
+    assert registry.active_version() is None
+    assert registry.artifact_paths() is None
+    assert registry.list_versions() == []
+
+    with pytest.raises(CustomeException, match='Unknown model version'):
+        registry.activate('0123456789abcdef')
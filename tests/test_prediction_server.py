@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+
+from src.pipelines.prediction_server import PredictionServer, PredictionServerConfig
+
+
+class StubPipeline:
+    '''
+    stands in for PredictPipeline: predicts reading + writing score and fails on negative scores
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def input_frame(self, columns):
+        return columns
+
+    def predict(self, columns):
+        self.calls.append(len(columns['reading_score']))
+        if any(score < 0 for score in columns['reading_score']):
+            raise ValueError('negative score')
+        return [reading + writing for reading, writing in zip(columns['reading_score'], columns['writing_score'])]
+
+    def known_categories(self):
+        return {
+            'gender': {'female', 'male'},
+            'race_ethnicity': None,
+            'parental_level_of_education': None,
+            'lunch': None,
+            'test_preparation_course': None
+        }
+
+
+def student(**values):
+    row = {
+        'gender': 'female',
+        'race_ethnicity': 'group B',
+        'parental_level_of_education': "bachelor's degree",
+        'lunch': 'standard',
+        'test_preparation_course': 'none',
+        'reading_score': 72,
+        'writing_score': 74
+    }
+    row.update(values)
+    return row
+
+async def request(app, method, path, body=None):
+    '''
+    drives one http request through the ASGI app and returns (status, json body)
+    '''
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b''
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': []}, receive, send)
+    start, response = sent
+    return start['status'], json.loads(response['body'])
+
+def serve(*requests, batch_window_ms=5.0):
+    '''
+    sends the requests concurrently to a server around a StubPipeline
+    '''
+    pipeline = StubPipeline()
+    server = PredictionServer(PredictionServerConfig(batch_window_ms=batch_window_ms), predict_pipeline=pipeline)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(request(server, *args) for args in requests))
+        finally:
+            if server.batcher is not None:
+                await server.batcher.stop()
+
+    return asyncio.run(run()), pipeline, server
+
+
+def test_predict_returns_the_prediction():
+    [(status, body)], _, _ = serve(('POST', '/predict', student()))
+    assert (status, body) == (200, {'prediction': 146.0})
+
+def test_predict_batch_accepts_rows_or_a_list():
+    rows = [student(), student(reading_score=10, writing_score=20)]
+    responses, _, _ = serve(('POST', '/predict/batch', {'rows': rows}), ('POST', '/predict/batch', rows))
+    assert responses == [(200, {'predictions': [146.0, 30.0]})] * 2
+
+@pytest.mark.parametrize('body', [
+    b'{not json',
+    [],
+    {'rows': 'a student'},
+    {'gender': 'female'}
+])
+def test_malformed_bodies_get_400(body):
+    path = '/predict' if isinstance(body, dict) and 'gender' in body else '/predict/batch'
+    [(status, response)], pipeline, server = serve(('POST', path, body))
+    assert status == 400
+    assert 'error' in response
+    assert pipeline.calls == []
+    assert server.stats.errors == 1
+
+@pytest.mark.parametrize('row', [
+    student(gender='other'),
+    student(reading_score='seventy'),
+    student(writing_score=True)
+])
+def test_unscorable_values_get_422(row):
+    [(status, response)], pipeline, _ = serve(('POST', '/predict', row))
+    assert status == 422
+    assert response['error'].startswith('row 0:')
+    assert pipeline.calls == []
+
+def test_missing_values_are_scored():
+    [(status, _)], _, _ = serve(('POST', '/predict', student(gender=None, lunch=None)))
+    assert status == 200
+
+def test_a_failing_request_does_not_fail_its_batch():
+    responses, pipeline, server = serve(
+        ('POST', '/predict', student()),
+        ('POST', '/predict/batch', [student(reading_score=-1), student()]),
+        ('POST', '/predict', student(reading_score=50, writing_score=50)),
+        batch_window_ms=200
+    )
+
+    assert responses[0] == (200, {'prediction': 146.0})
+    assert responses[1][0] == 500
+    assert responses[2] == (200, {'prediction': 100.0})
+    # one call for the whole batch, then one per request
+    assert pipeline.calls == [4, 1, 2, 1]
+    assert server.stats.errors == 1
+
+def test_health_metrics_and_unknown_routes():
+    responses, _, _ = serve(('GET', '/health'), ('GET', '/metrics'), ('GET', '/nowhere'), ('POST', '/health'))
+    assert responses[0] == (200, {'status': 'ok'})
+    assert responses[1][0] == 200
+    assert {'requests', 'errors', 'latency_p99_ms'} <= set(responses[1][1])
+    assert [status for status, _ in responses[2:]] == [404, 404]
@@ -0,0 +1,53 @@
+import multiprocessing
+import time
+
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+
+import src.execution_budget
+from src.utils import evaluate_model
+
+
+class SlowRegressor(RegressorMixin, BaseEstimator):
+    # module level so the spawned search workers can unpickle it
+    def __init__(self, delay=60.0):
+        self.delay = delay
+
+    def fit(self, X, y):
+        time.sleep(self.delay)
+        self.mean_ = float(np.mean(y))
+        return self
+
+    def predict(self, X):
+        return np.full(len(X), self.mean_)
+
+
+class Cancelled(Exception):
+    pass
+
+
+def test_cancelling_terminates_the_running_searches(monkeypatch):
+    # two search workers even on a single core machine
+    monkeypatch.setattr(src.execution_budget, 'available_cores', lambda: 2)
+
+    def progress(name, finished, total):
+        raise Cancelled()
+
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(40, 3)), rng.normal(size=40)
+    models = {'a': SlowRegressor(), 'b': SlowRegressor()}
+    param = {'a': {'delay': [60.0]}, 'b': {'delay': [60.0]}}
+
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        evaluate_model(X, y, X, y, models, param, n_jobs=2, progress=progress)
+    assert time.perf_counter() - start < 30
+
+    deadline = time.perf_counter() + 10
+    while multiprocessing.active_children() and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from src.utils import _search_model, load_object, save_object
+
+SEARCH = {'strategy': 'grid', 'max_fits': None, 'time_budget': None, 'patience': 2}
+
+
+def make_data(seed, n_rows=120):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 4))
+    return X, 2 * X[:, 0] - X[:, 1] + rng.normal(scale=0.1, size=n_rows)
+
+def search(model, para, n_jobs=2):
+    X_train, y_train = make_data(0)
+    X_test, y_test = make_data(1)
+    return _search_model(type(model).__name__, model, para, X_train, y_train, X_test, y_test, n_jobs, SEARCH), X_test
+
+
+def test_catboost_search_saves_a_usable_model(tmp_path):
+    catboost = pytest.importorskip('catboost')
+
+    result, X_test = search(catboost.CatBoostRegressor(verbose=False, iterations=20, allow_writing_files=False), {'depth': [2, 4]})
+    model_path = str(tmp_path / 'model.pkl')
+    save_object(model_path, result['estimator'])
+
+    # catboost params are frozen once fitted: the search's thread count stays, predict uses its own
+    loaded = load_object(model_path)
+    assert loaded.get_params()['thread_count'] == 1
+    np.testing.assert_allclose(loaded.predict(X_test), result['estimator'].predict(X_test))
+
+def test_sklearn_model_is_saved_with_the_default_thread_count(tmp_path):
+    result, _ = search(RandomForestRegressor(n_estimators=5, random_state=0), {'max_depth': [2, 3]})
+    model_path = str(tmp_path / 'model.pkl')
+    save_object(model_path, result['estimator'])
+    assert load_object(model_path).get_params()['n_jobs'] is None
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+pd = pytest.importorskip('pandas')
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+from src.components.data_transformation import DataTransformation
+from src.pipelines.predict_pipeline import FEATURE_COLUMNS
+from src.pipelines.shared_model import SharedModelClient, SharedModelPublisher, get_shared_model, write_generation
+from src.utils import save_object
+
+STUD_CSV = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'data', 'stud.csv')
+
+
+@pytest.fixture(scope='module')
+def stud():
+    return pd.read_csv(STUD_CSV)
+
+@pytest.fixture(scope='module')
+def fitted(stud):
+    preprocessor = DataTransformation().get_data_transformer_object().fit(stud[FEATURE_COLUMNS])
+    X = preprocessor.transform(stud[FEATURE_COLUMNS])
+    linear = LinearRegression().fit(X, stud['math_score'])
+    forest = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(X, stud['math_score'])
+    return preprocessor, linear, forest
+
+def save_artifacts(directory, preprocessor, model):
+    model_path, preprocessor_path = os.path.join(directory, 'model.pkl'), os.path.join(directory, 'preprocessor.pkl')
+    save_object(model_path, model)
+    save_object(preprocessor_path, preprocessor)
+    return model_path, preprocessor_path
+
+
+@pytest.mark.parametrize('model_name', ['linear', 'forest'])
+def test_attached_predictor_matches_the_model(stud, fitted, tmp_path, model_name):
+    preprocessor, linear, forest = fitted
+    model = linear if model_name == 'linear' else forest
+    paths = save_artifacts(str(tmp_path), preprocessor, model)
+    shared_dir = str(tmp_path / 'shared')
+
+    assert SharedModelPublisher(shared_dir).publish(*paths) == 1
+    predictor = SharedModelClient(shared_dir).predictor()
+
+    expected = model.predict(preprocessor.transform(stud[FEATURE_COLUMNS]))
+    np.testing.assert_allclose(predictor.predict(stud), expected, rtol=1e-9, atol=1e-9)
+    # read only views of the mapped files, not private copies
+    assert not predictor.num_mean.flags.writeable
+
+def test_workers_follow_new_generations(fitted, tmp_path):
+    preprocessor, linear, forest = fitted
+    publisher = SharedModelPublisher(str(tmp_path / 'shared'))
+    client = SharedModelClient(publisher.shared_model_config.shared_dir)
+    assert client.predictor() is None
+
+    publisher.publish(*save_artifacts(str(tmp_path), preprocessor, linear))
+    assert client.predictor().coef is not None
+    publisher.publish(*save_artifacts(str(tmp_path), preprocessor, forest))
+    assert client.predictor().coef is None
+    assert client.generation == 2
+
+    # a generation that cannot be attached leaves the previous one in use
+    write_generation(publisher.shared_model_config.shared_dir, {'generation': 3, 'dir': 'gen-3'})
+    predictor = client.predictor()
+    assert predictor is not None and client.generation == 2
+
+def test_old_generations_are_removed_and_taken_numbers_skipped(fitted, tmp_path):
+    preprocessor, linear, _ = fitted
+    paths = save_artifacts(str(tmp_path), preprocessor, linear)
+    shared_dir = tmp_path / 'shared'
+    publisher = SharedModelPublisher(str(shared_dir))
+
+    publisher.publish(*paths)
+    # a concurrent publisher already allocated the next generation
+    (shared_dir / 'gen-2').mkdir()
+    assert publisher.publish(*paths) == 3
+    assert publisher.publish(*paths) == 4
+
+    assert sorted(name for name in os.listdir(shared_dir) if name.startswith('gen-')) == ['gen-3', 'gen-4']
+    with open(shared_dir / 'GENERATION') as file_obj:
+        assert json.load(file_obj)['dir'] == 'gen-4'
+
+def test_a_generation_of_other_artifacts_is_not_served(fitted, tmp_path):
+    preprocessor, linear, forest = fitted
+    (tmp_path / 'served').mkdir()
+    (tmp_path / 'other').mkdir()
+    served = save_artifacts(str(tmp_path / 'served'), preprocessor, linear)
+    other = save_artifacts(str(tmp_path / 'other'), preprocessor, forest)
+    shared_dir = str(tmp_path / 'shared')
+    SharedModelPublisher(shared_dir).publish(*served)
+
+    assert get_shared_model(shared_dir, *served) is not None
+    # eg. the registry switched versions and the publisher has not caught up: serve from the files
+    assert get_shared_model(shared_dir, *other) is None
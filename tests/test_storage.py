@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+
+from src.exception import CustomeException
+from src.storage import CATEGORICAL_COLUMNS, SCORE_COLUMNS, artifact_file, read_frame, write_frame
+
+STUD_CSV = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'data', 'stud.csv')
+
+
+@pytest.fixture(scope='module')
+def stud():
+    return pd.read_csv(STUD_CSV).head(200)
+
+@pytest.mark.parametrize('artifact_format', ['parquet', 'arrow', 'csv'])
+def test_round_trip_keeps_values_and_applies_stud_dtypes(stud, tmp_path, artifact_format):
+    path = artifact_file(str(tmp_path / 'nested'), 'train', artifact_format)
+    write_frame(stud, path)
+
+    df = read_frame(path)
+
+    assert list(df.columns) == list(stud.columns)
+    assert all(df[column].dtype == 'category' for column in CATEGORICAL_COLUMNS)
+    assert all(df[column].dtype == 'int16' for column in SCORE_COLUMNS)
+    pd.testing.assert_frame_equal(df.astype(object), stud.astype(object))
+
+def test_scores_with_missing_values_are_float32(stud, tmp_path):
+    stud = stud.copy()
+    stud.loc[stud.index[::7], 'reading_score'] = float('nan')
+    path = str(tmp_path / 'train.parquet')
+    write_frame(stud, path)
+
+    df = read_frame(path)
+
+    assert df['reading_score'].dtype == 'float32'
+    assert df['reading_score'].isna().sum() == stud['reading_score'].isna().sum()
+    assert df['math_score'].dtype == 'int16'
+
+def test_a_part_directory_reads_as_one_frame(stud, tmp_path):
+    parts = tmp_path / 'raw'
+    write_frame(stud.iloc[:120], str(parts / 'part-0.parquet'))
+    write_frame(stud.iloc[120:], str(parts / 'part-1.parquet'))
+    # hidden files are skipped
+    (parts / '.DS_Store').write_bytes(b'')
+
+    df = read_frame(str(parts))
+
+    assert len(df) == len(stud)
+    assert df['gender'].dtype == 'category'
+    pd.testing.assert_frame_equal(df.astype(object), stud.reset_index(drop=True).astype(object))
+
+def test_an_empty_part_directory_reads_as_an_empty_stud_frame(tmp_path):
+    (tmp_path / 'raw').mkdir()
+
+    df = read_frame(str(tmp_path / 'raw'))
+
+    assert df.empty
+    assert list(df.columns) == CATEGORICAL_COLUMNS + SCORE_COLUMNS
+    assert all(df[column].dtype == 'category' for column in CATEGORICAL_COLUMNS)
+    assert all(df[column].dtype == 'int16' for column in SCORE_COLUMNS)
+
+def test_unknown_formats_are_rejected(stud, tmp_path):
+    with pytest.raises(ValueError, match='Unknown artifact format'):
+        artifact_file(str(tmp_path), 'train', 'xlsx')
+    with pytest.raises(CustomeException, match='Cannot tell the artifact format'):
+        write_frame(stud, str(tmp_path / 'train.xlsx'))
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+import pytest
+
+import src.pipelines.train_pipeline as train_pipeline
+from src.pipelines.training_jobs import TrainingJobManager
+
+
+def wait_until_done(job, timeout=10):
+    deadline = time.time() + timeout
+    while not job.done:
+        assert time.time() < deadline, f'job still {job.status}'
+        time.sleep(0.01)
+
+def write_artifacts(output_dir, content):
+    for file_name in ('model.pkl', 'preprocessor.pkl'):
+        with open(os.path.join(output_dir, file_name), 'wb') as file_obj:
+            file_obj.write(content + file_name.encode())
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.delenv('SHARED_MODEL_DIR', raising=False)
+    return TrainingJobManager(str(tmp_path / 'artifact'))
+
+@pytest.fixture
+def gate(monkeypatch):
+    '''
+    a fake pipeline that reports progress until the gate is opened, then writes its artifacts
+    '''
+    opened = threading.Event()
+
+    def run_training_pipeline(output_dir, progress, metadata, content=b'one'):
+        while not opened.wait(0.01):
+            progress('model_search', 0.5)
+        progress('model_search', 1.0)
+        write_artifacts(output_dir, content)
+        metadata['model_name'] = 'Fake'
+        return 0.9
+
+    monkeypatch.setattr(train_pipeline, 'run_training_pipeline', run_training_pipeline)
+    return opened
+
+def test_a_finished_job_is_registered_and_activated(manager, gate):
+    job = manager.submit()
+    gate.set()
+    wait_until_done(job)
+
+    assert job.status == 'succeeded'
+    assert job.result == 0.9
+    assert manager.model_registry.active_version() == job.version
+    assert manager.model_registry.metadata(job.version)['model_name'] == 'Fake'
+    # serving reads the registry, the training run never writes the top level artifacts
+    assert not os.path.exists(os.path.join(manager.artifact_dir, 'model.pkl'))
+    assert os.listdir(manager.staging_root) == []
+
+def test_submitting_while_running_returns_the_running_job(manager, gate):
+    job = manager.submit()
+    assert manager.submit(content=b'two') is job
+    gate.set()
+    wait_until_done(job)
+
+    second = manager.submit(content=b'two')
+    assert second is not job
+    wait_until_done(second)
+    assert second.status == 'succeeded'
+    assert manager.model_registry.rollback() == job.version
+
+def test_a_cancelled_job_publishes_nothing(manager, gate):
+    job = manager.submit()
+    while job.stage is None:
+        time.sleep(0.01)
+
+    assert manager.cancel()
+    wait_until_done(job)
+
+    assert job.status == 'cancelled'
+    assert job.version is None
+    assert manager.model_registry.active_version() is None
+    assert not manager.cancel()
+
+def test_a_failed_job_keeps_the_active_version(manager, gate, monkeypatch):
+    gate.set()
+    first = manager.submit()
+    wait_until_done(first)
+
+    def failing_pipeline(output_dir, progress, metadata):
+        raise ValueError('no training data')
+
+    monkeypatch.setattr(train_pipeline, 'run_training_pipeline', failing_pipeline)
+    job = manager.submit()
+    wait_until_done(job)
+
+    assert job.status == 'failed'
+    assert 'no training data' in job.error
+    assert manager.model_registry.active_version() == first.version
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip('sklearn')
+
+import numpy as np
+
+from sklearn.ensemble import AdaBoostRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from src.utils import save_object
+from src.pipelines.tree_predictor import TreePredictor, export_trees, flatten_trees, load_model
+
+MODELS = [
+    DecisionTreeRegressor(random_state=0),
+    RandomForestRegressor(n_estimators=20, random_state=0),
+    GradientBoostingRegressor(n_estimators=30, random_state=0),
+    AdaBoostRegressor(n_estimators=20, random_state=0)
+]
+
+
+def make_data(seed, n_rows=400):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 6))
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) + X[:, 2] * X[:, 3] + rng.normal(scale=0.1, size=n_rows)
+    return X, y
+
+def fitted_predictor(model):
+    X, y = make_data(0)
+    model.fit(X, y)
+    arrays, manifest = flatten_trees(model)
+    return TreePredictor(manifest, arrays), arrays
+
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: type(model).__name__)
+def test_predictions_match_sklearn(model):
+    predictor, _ = fitted_predictor(model)
+    X, _ = make_data(1)
+    np.testing.assert_array_equal(predictor.predict(X), model.predict(X))
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: type(model).__name__)
+def test_threshold_edge_cases(model):
+    # values on and right next to every split threshold, in float64 and float32: sklearn compares
+    # float32 inputs with float64 thresholds, so rounding decides the branch here
+    predictor, arrays = fitted_predictor(model)
+    internal = arrays['left'] >= 0
+    base = make_data(2, n_rows=1)[0][0]
+
+    rows = []
+    for feature, threshold in zip(arrays['feature'][internal], arrays['threshold'][internal]):
+        threshold32 = np.float32(threshold)
+        for value in (threshold, np.nextafter(threshold, -np.inf), np.nextafter(threshold, np.inf),
+                      threshold32, np.nextafter(threshold32, np.float32(-np.inf)), np.nextafter(threshold32, np.float32(np.inf))):
+            row = base.copy()
+            row[feature] = value
+            rows.append(row)
+    X = np.array(rows)
+
+    np.testing.assert_array_equal(predictor.predict(X), model.predict(X))
+
+def test_export_is_loaded_in_place_of_the_pickle(tmp_path):
+    model = RandomForestRegressor(n_estimators=5, random_state=0)
+    X, y = make_data(0)
+    model.fit(X, y)
+
+    model_path = str(tmp_path / 'model.pkl')
+    save_object(model_path, model)
+    export_trees(model, model_path)
+
+    loaded = load_model(model_path)
+    assert isinstance(loaded, TreePredictor)
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+def test_non_tree_models_are_not_flattened():
+    from sklearn.linear_model import LinearRegression
+
+    X, y = make_data(0)
+    assert flatten_trees(LinearRegression().fit(X, y)) is None